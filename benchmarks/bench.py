@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for transit_time.py against canned (synthetic) API responses
+Starts stub_server.py, times end-to-end CLI runs, connection parsing and
+matrix throughput, and writes the results as JSON for comparing revisions.
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import contextlib
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+import transit_time
+from stub_server import load_fixtures
+
+ORIGINS = ["Nyon", "Renens", "Morges"]
+DESTINATIONS = ["Lausanne", "Genève", "Bern", "Zürich HB", "Basel SBB", "Meyrin Bergère"]
+
+def summarize(samples, **extra):
+    """Summarize run times in seconds as milliseconds"""
+    samples = sorted(samples)
+    percentile = transit_time.percentile
+    result = {
+        "runs": len(samples),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "min_ms": round(min(samples) * 1000, 3)
+    }
+    result.update(extra)
+    return result
+
+class StubProcess:
+    """Run stub_server.py in a subprocess for the duration of a with block"""
+    def __init__(self, latency, jitter, error_rate, seed):
+        self.args = [sys.executable, os.path.join(BENCH_DIR, "stub_server.py"),
+                     "--latency", str(latency), "--jitter", str(jitter),
+                     "--error-rate", str(error_rate), "--seed", str(seed)]
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.args, stdout=subprocess.PIPE, text=True)
+        self.url = self.process.stdout.readline().strip()
+        return self
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait()
+
+    def requests(self):
+        """Requests answered so far"""
+        client = transit_time.TransportClient(self.url.rsplit("/", 1)[0], rate_limit=None)
+        try:
+            return client.session.get(client.base_url + "/stats").json()["requests"]
+        finally:
+            client.close()
+
+def run_cli(argv):
+    """Run the CLI in this process with its output discarded; return the seconds it took"""
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        try:
+            transit_time.main(argv)
+        except SystemExit:
+            pass
+    return time.perf_counter() - started
+
+def bench_cli(stub, argv, repeat, warm=False):
+    """Time repeated CLI runs; with warm, after one untimed run to fill the cache"""
+    if warm:
+        run_cli(argv)
+    before = stub.requests()
+    samples = [run_cli(argv) for _ in range(repeat)]
+    return summarize(samples, requests_per_run=(stub.requests() - before) / repeat)
+
+def bench_process(stub, argv, repeat, warm=False):
+    """Time repeated runs of a fresh Python process, start-up included"""
+    if warm:
+        subprocess.run(argv, cwd=REPO_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    before = stub.requests()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run(argv, cwd=REPO_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - started)
+    return summarize(samples, requests_per_run=(stub.requests() - before) / repeat)
+
+def bench_parse(repeat):
+    """Time parse_connection() over every connection in the fixtures"""
+    _, canned = load_fixtures()
+    connections = [conn for response in canned.values() for conn in response["connections"]]
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for conn in connections:
+            transit_time.parse_connection(conn)
+        samples.append(time.perf_counter() - started)
+    result = summarize(samples, connections=len(connections))
+    result["us_per_connection"] = round(result["p50_ms"] * 1000 / len(connections), 3)
+    return result
+
+def bench_render(repeat):
+    """Time parsing and printing every connection in the fixtures with its route details"""
+    _, canned = load_fixtures()
+    responses = [response["connections"] for response in canned.values()]
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for response in responses:
+                result = {"status": "OK",
+                          "connections": [transit_time.parse_connection(conn) for conn in response]}
+                transit_time.print_result("Bench", "Bench", True, result, detailed=True)
+        samples.append(time.perf_counter() - started)
+    return summarize(samples, responses=len(responses))
+
+def bench_matrix(stub, workdir, repeat, jobs):
+    """Time the matrix command over ORIGINS × DESTINATIONS"""
+    origins = os.path.join(workdir, "origins.csv")
+    destinations = os.path.join(workdir, "destinations.csv")
+    for path, places in ((origins, ORIGINS), (destinations, DESTINATIONS)):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("address\n" + "".join(f"{place}\n" for place in places))
+    output = os.path.join(workdir, "matrix.csv")
+    argv = ["matrix", "--origins", origins, "--destinations", destinations, "--output", output,
+            "--api-url", stub.url, "--no-cache", "--rate", "1000", "--jobs", str(jobs)]
+    result = bench_cli(stub, argv, repeat)
+    pairs = len(ORIGINS) * len(DESTINATIONS)
+    result["pairs"] = pairs
+    result["pairs_per_second"] = round(pairs / (result["p50_ms"] / 1000), 1)
+    return result
+
+def run_benchmarks(args):
+    workdir = tempfile.mkdtemp(prefix="transit_bench_")
+    # Keep the user's caches and timetable out of the measurements
+    os.environ["XDG_CACHE_HOME"] = workdir
+    results = {}
+    try:
+        with StubProcess(args.latency, args.jitter, args.error_rate, args.seed) as stub:
+            common = ["--api-url", stub.url, "--rate", "1000"]
+            destinations = [option for place in DESTINATIONS for option in ("-t", place)]
+            script = [sys.executable, os.path.join(REPO_DIR, "transit_time.py")]
+            benchmarks = {
+                # Start-up: the interpreter alone, importing the module, and whole runs from the cache
+                # (python -m can use the compiled module; a script is compiled on every run)
+                "startup_python": lambda: bench_process(stub, [sys.executable, "-c", "pass"], args.repeat),
+                "startup_import": lambda: bench_process(stub, [sys.executable, "-c", "import transit_time"],
+                                                        args.repeat),
+                "startup_cached": lambda: bench_process(stub, [*script, "Nyon", "--only", *destinations,
+                                                               *common], args.repeat, warm=True),
+                "startup_cached_module": lambda: bench_process(stub, [sys.executable, "-m", "transit_time",
+                                                                      "Nyon", "--only", *destinations,
+                                                                      *common], args.repeat, warm=True),
+                "parse_connection": lambda: bench_parse(args.repeat * 20),
+                "render_detailed": lambda: bench_render(args.repeat * 20),
+                "main_cold": lambda: bench_cli(stub, ["Nyon", "--only", *destinations,
+                                                      "--no-cache", *common], args.repeat),
+                "main_warm": lambda: bench_cli(stub, ["Nyon", "--only", *destinations, *common],
+                                               args.repeat, warm=True),
+                "main_detailed": lambda: bench_cli(stub, ["Nyon", "-d", "-n", "8", "--no-cache",
+                                                          *common], args.repeat),
+                "matrix": lambda: bench_matrix(stub, workdir, args.repeat, args.jobs),
+            }
+            for name, bench in benchmarks.items():
+                if args.only and name not in args.only:
+                    continue
+                print(f"⏱️  {name}...", file=sys.stderr)
+                results[name] = bench()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=BENCH_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(old, new):
+    """Print the p50 of each benchmark in two result files side by side"""
+    print(f"{'Benchmark':<20} {'Before ms':>10} {'After ms':>10} {'Change':>8}")
+    for name, result in new["benchmarks"].items():
+        before = old["benchmarks"].get(name)
+        if before:
+            change = (result["p50_ms"] - before["p50_ms"]) / before["p50_ms"]
+            print(f"{name:<20} {before['p50_ms']:>10.2f} {result['p50_ms']:>10.2f} {change:>+8.1%}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark transit_time.py against canned API responses")
+    parser.add_argument("--output",
+                       metavar="FILE",
+                       help="Write the results as JSON to FILE (default: standard output)")
+    parser.add_argument("--compare",
+                       metavar="FILE",
+                       help="Print how the results differ from an earlier results FILE")
+    parser.add_argument("--repeat",
+                       type=int,
+                       default=5,
+                       help="Timed runs per benchmark (default: %(default)s)")
+    parser.add_argument("--only",
+                       nargs="+",
+                       metavar="NAME",
+                       help="Run only these benchmarks")
+    parser.add_argument("--latency",
+                       metavar="MS",
+                       type=float,
+                       default=20,
+                       help="Stub API response delay (default: %(default)s)")
+    parser.add_argument("--jitter",
+                       metavar="MS",
+                       type=float,
+                       default=10,
+                       help="Random extra stub API delay, up to (default: %(default)s)")
+    parser.add_argument("--error-rate",
+                       metavar="P",
+                       type=float,
+                       default=0,
+                       help="Fraction of stub API requests that fail (default: %(default)s)")
+    parser.add_argument("--jobs",
+                       type=int,
+                       default=transit_time.DEFAULT_JOBS,
+                       help="Parallel lookups for the matrix benchmark (default: %(default)s)")
+    parser.add_argument("--seed",
+                       type=int,
+                       default=1,
+                       help="Seed for the stub's jitter and errors (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"repeat": args.repeat, "latency_ms": args.latency, "jitter_ms": args.jitter,
+                   "error_rate": args.error_rate, "jobs": args.jobs, "seed": args.seed},
+        "benchmarks": run_benchmarks(args)
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the transport.opendata.ch API, for reproducible benchmarks
+Answers /v1/locations and /v1/connections from the canned responses in
+fixtures/, with optional injected latency, jitter and errors. The fixtures are
+synthetic: generated in the API's format, not recorded from it. /v1/stationboard
+is made up from their rides, moved to the coming day.
+"""
+
+import os
+import json
+import math
+import time
+import random
+import zlib
+import argparse
+import threading
+import urllib.parse
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# The fixtures' time zone
+SWISS_TIME = timezone(timedelta(hours=2))
+
+def load_fixtures(path=FIXTURES_DIR):
+    """Load the canned responses: locations by normalized query, connections by 'from|to'"""
+    with open(os.path.join(path, "locations.json"), encoding="utf-8") as f:
+        locations = json.load(f)
+    with open(os.path.join(path, "connections.json"), encoding="utf-8") as f:
+        connections = json.load(f)
+    return locations, connections
+
+def normalize(query):
+    return " ".join(query.casefold().split())
+
+def project(value, tree):
+    """Keep only the fields[] paths (as a nested dict of path parts) of a response"""
+    if not tree:
+        return value
+    if isinstance(value, list):
+        return [project(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {key: project(value[key], subtree) for key, subtree in tree.items() if key in value}
+    return value
+
+def fields_tree(fields):
+    tree = {}
+    for path in fields:
+        node = tree
+        for part in path.split("/"):
+            node = node.setdefault(part, {})
+    return tree
+
+class StubAPI:
+    """Answers API requests from the fixtures; thread-safe request counters"""
+    def __init__(self, locations, connections, latency=0.0, jitter=0.0, error_rate=0.0,
+                 error_status=500):
+        self.locations = locations
+        self.connections = connections
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.counts = {"requests": 0, "errors": 0, "bytes": 0}
+        self.lock = threading.Lock()
+
+        # Every station in the fixtures, for coordinate searches and unknown queries
+        self.stations = {}
+        for response in locations.values():
+            for station in response["stations"]:
+                self.stations[station["id"]] = station
+        
+        # Every ride in the fixtures, by the station it leaves from, as (time of day, ride)
+        self.rides = {}
+        for response in connections.values():
+            for conn in response["connections"]:
+                for section in conn.get("sections") or []:
+                    if section.get("journey") and section["departure"].get("departure"):
+                        leaves = datetime.fromisoformat(section["departure"]["departure"])
+                        ride = (leaves.strftime("%H:%M"), section["journey"]["category"],
+                                section["journey"]["number"], section["journey"]["to"],
+                                section["journey"]["name"], section["departure"].get("platform"))
+                        self.rides.setdefault(section["departure"]["station"]["id"], set()).add(ride)
+
+    def answer(self, path, query):
+        """Return (status, body dict) for a request"""
+        if random.random() < self.error_rate:
+            return self.error_status, {"errors": [{"message": "Injected error"}]}
+
+        if path.endswith("/locations"):
+            return 200, self.search(query)
+        if path.endswith("/connections"):
+            return 200, self.route(query)
+        if path.endswith("/stationboard"):
+            return 200, self.board(query)
+        return 404, {"errors": [{"message": f"Unknown endpoint {path}"}]}
+
+    def search(self, query):
+        if "query" in query:
+            text = normalize(query["query"][0])
+            if text in self.locations:
+                return self.locations[text]
+            # Other queries get a made-up but stable station
+            return {"stations": [{"id": str(8500000 + zlib.crc32(text.encode()) % 99999),
+                                  "name": query["query"][0].strip().title(),
+                                  "score": None,
+                                  "coordinate": {"type": "WGS84", "x": 46.5, "y": 6.6},
+                                  "distance": None}]}
+
+        # Coordinate search: the fixtures' stations, nearest first
+        x, y = float(query["x"][0]), float(query["y"][0])
+        nearest = sorted(self.stations.values(),
+                         key=lambda s: math.hypot(s["coordinate"]["x"] - x,
+                                                  (s["coordinate"]["y"] - y) * math.cos(math.radians(x))))
+        return {"stations": nearest[:10]}
+
+    def route(self, query):
+        key = f"{query['from'][0]}|{query['to'][0]}"
+        # Other pairs get the first canned response
+        response = self.connections.get(key) or next(iter(self.connections.values()))
+        canned = response["connections"]
+        limit = int(query.get("limit", ["4"])[0])
+        page = int(query.get("page", ["0"])[0])
+        # Pages past the canned ones start over from the first connection
+        connections = [canned[(page * limit + i) % len(canned)] for i in range(limit)]
+        body = dict(response, connections=connections)
+
+        fields = query.get("fields[]")
+        if fields:
+            body = project(body, fields_tree(fields))
+        return body
+
+    def board(self, query):
+        """The rides from a station in the fixtures, as the next departures from now"""
+        station = self.stations.get(query.get("id", [""])[0])
+        if station is None:
+            return {"errors": [{"message": "Station not found"}]}
+        limit = int(query.get("limit", ["40"])[0])
+        now = datetime.now(SWISS_TIME).replace(second=0, microsecond=0)
+        
+        # One ride per line and minute, whatever the platforms given
+        rides = sorted({ride[:5]: ride for ride in sorted(self.rides.get(station["id"], ()))}.values())
+        entries = []
+        for day in range(2):
+            for clock, category, number, to, name, platform in rides:
+                hour, minute = map(int, clock.split(":"))
+                leaves = now.replace(hour=hour, minute=minute) + timedelta(days=day)
+                if leaves < now:
+                    continue
+                if len(entries) == limit:
+                    break
+                # Some departures run late, differently at each request
+                delay = random.choice([0, 0, 0, 1, 2, 5])
+                expected = leaves + timedelta(minutes=delay)
+                entries.append({
+                    "stop": {"station": station,
+                             "departure": leaves.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                             "departureTimestamp": int(leaves.timestamp()),
+                             "delay": delay,
+                             "platform": platform,
+                             "prognosis": {"platform": None,
+                                           "departure": expected.strftime("%Y-%m-%dT%H:%M:%S%z")
+                                                        if delay else None}},
+                    "name": name, "category": category, "number": number, "operator": "SBB",
+                    "to": to, "passList": []
+                })
+        body = {"station": station, "stationboard": entries}
+        
+        fields = query.get("fields[]")
+        if fields:
+            body = project(body, fields_tree(fields))
+        return body
+
+    def count(self, status, size):
+        with self.lock:
+            self.counts["requests"] += 1
+            self.counts["errors"] += status != 200
+            self.counts["bytes"] += size
+
+def make_handler(api):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            url = urllib.parse.urlsplit(self.path)
+            if url.path == "/stats":
+                with api.lock:
+                    status, body = 200, dict(api.counts)
+            else:
+                delay = api.latency + random.uniform(0, api.jitter)
+                if delay:
+                    time.sleep(delay)
+                status, body = api.answer(url.path, urllib.parse.parse_qs(url.query))
+
+            data = json.dumps(body, ensure_ascii=False).encode()
+            if url.path != "/stats":
+                api.count(status, len(data))
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            if status == 429:
+                self.send_header("Retry-After", "1")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer transport API requests with canned responses")
+    parser.add_argument("--port",
+                       type=int,
+                       default=0,
+                       help="Port to listen on (default: any free port)")
+    parser.add_argument("--latency",
+                       metavar="MS",
+                       type=float,
+                       default=0,
+                       help="Delay every response by this many milliseconds")
+    parser.add_argument("--jitter",
+                       metavar="MS",
+                       type=float,
+                       default=0,
+                       help="Add a random delay of up to this many milliseconds")
+    parser.add_argument("--error-rate",
+                       metavar="P",
+                       type=float,
+                       default=0,
+                       help="Fraction of requests answered with an error (0-1)")
+    parser.add_argument("--error-status",
+                       type=int,
+                       default=500,
+                       help="HTTP status of injected errors, e.g. 429 (default: 500)")
+    parser.add_argument("--fixtures",
+                       metavar="DIR",
+                       default=FIXTURES_DIR,
+                       help="Directory with locations.json and connections.json")
+    parser.add_argument("--seed",
+                       type=int,
+                       help="Seed the jitter and errors for repeatable runs")
+    args = parser.parse_args(argv)
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    api = StubAPI(*load_fixtures(args.fixtures), latency=args.latency / 1000,
+                  jitter=args.jitter / 1000, error_rate=args.error_rate,
+                  error_status=args.error_status)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(api))
+    server.daemon_threads = True
+    # The first line tells whoever started us where to connect
+    print(f"http://127.0.0.1:{server.server_port}/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Shared fixtures: a tiny GTFS feed, timetables imported from it, and the
+benchmarks' stub API server
+The feed's lines run on weekdays around Lake Geneva:
+  IR 15  Nyon - Gland - Rolle (platform 1) - Allaman - Morges, every 30 minutes
+  B 725  Rolle (platform 2) - Aubonne - Bière, every 30 minutes
+  S 99   Nyon - Bière direct but slow, every hour
+"""
+
+import os
+import csv
+import sys
+import threading
+from datetime import date
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# transit_time.py, and the benchmarks' stub server with its canned API responses
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "benchmarks"))
+
+import transit_time
+from stub_server import StubAPI, load_fixtures, make_handler
+
+# A day the feed's weekday service runs, and one it doesn't
+MONDAY = date(2026, 6, 1)
+SUNDAY = date(2026, 6, 7)
+
+def clock(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}:00"
+
+def trips(route, prefix, first, last, every, stops):
+    """Rows for trips.txt and stop_times.txt: trips leaving every `every` minutes
+
+    `stops` lists (stop_id, minutes after the first stop).
+    """
+    trip_rows, stop_time_rows = [], []
+    for start in range(first, last + 1, every):
+        trip_id = f"{prefix}{start}"
+        trip_rows.append([route, "WD", trip_id, ""])
+        for sequence, (stop_id, offset) in enumerate(stops, 1):
+            stop_time_rows.append([trip_id, clock(start + offset), clock(start + offset), stop_id,
+                                   sequence])
+    return trip_rows, stop_time_rows
+
+def tiny_feed():
+    """Return the feed's tables as {file name: (header, rows)}"""
+    ir_trips, ir_times = trips("IR", "IR", 6 * 60, 9 * 60, 30,
+                               [("8508005", 0), ("8501036", 6), ("8501037:0:1", 12),
+                                ("8501038", 17), ("8501039", 25)])
+    bus_trips, bus_times = trips("B", "B", 6 * 60 + 20, 9 * 60, 30,
+                                 [("8501037:0:2", 0), ("8501040", 9), ("8501041", 20)])
+    s_trips, s_times = trips("S", "S", 6 * 60, 9 * 60, 60, [("8508005", 0), ("8501041", 80)])
+    return {
+        "stops.txt": (["stop_id", "stop_name", "stop_lat", "stop_lon", "location_type", "parent_station"], [
+            ["8508005", "Nyon", 46.383, 6.239, "", ""],
+            ["8501036", "Gland", 46.420, 6.270, "", ""],
+            ["Parent8501037", "Rolle", 46.458, 6.336, "1", ""],
+            ["8501037:0:1", "Rolle", 46.458, 6.336, "", "Parent8501037"],
+            ["8501037:0:2", "Rolle", 46.4582, 6.3362, "", "Parent8501037"],
+            ["8501038", "Allaman", 46.470, 6.400, "", ""],
+            ["8501039", "Morges", 46.510, 6.498, "", ""],
+            ["8501040", "Aubonne", 46.495, 6.391, "", ""],
+            ["8501041", "Bière", 46.537, 6.341, "", ""],
+        ]),
+        "routes.txt": (["route_id", "route_short_name", "route_desc", "route_type"], [
+            ["IR", "15", "IR", "2"], ["B", "725", "B", "3"], ["S", "99", "S", "2"],
+        ]),
+        "calendar.txt": (["service_id", "monday", "tuesday", "wednesday", "thursday", "friday",
+                          "saturday", "sunday", "start_date", "end_date"], [
+            ["WD", "1", "1", "1", "1", "1", "0", "0", "20260101", "20261231"],
+        ]),
+        "calendar_dates.txt": (["service_id", "date", "exception_type"], [["WD", "20261225", "2"]]),
+        "trips.txt": (["route_id", "service_id", "trip_id", "trip_short_name"],
+                      ir_trips + bus_trips + s_trips),
+        "stop_times.txt": (["trip_id", "arrival_time", "departure_time", "stop_id", "stop_sequence"],
+                           ir_times + bus_times + s_times),
+        "transfers.txt": (["from_stop_id", "to_stop_id", "transfer_type", "min_transfer_time"], [
+            ["8501037:0:1", "8501037:0:2", "2", "180"],
+        ]),
+    }
+
+def write_feed(directory, tables):
+    os.makedirs(directory, exist_ok=True)
+    for name, (header, rows) in tables.items():
+        with open(os.path.join(directory, name), "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+
+@pytest.fixture
+def build_timetable(tmp_path):
+    """Return a function importing the tiny feed, with some tables replaced, as a Timetable"""
+    opened = []
+
+    def build(**tables):
+        feed = tiny_feed()
+        feed.update((name.replace("_txt", ".txt"), table) for name, table in tables.items())
+        directory = str(tmp_path / f"feed{len(opened)}")
+        write_feed(directory, feed)
+        path = str(tmp_path / f"timetable{len(opened)}.bin")
+        transit_time.import_gtfs(directory, path, progress=lambda message: None)
+        timetable = transit_time.Timetable(path)
+        opened.append(timetable)
+        return timetable
+
+    yield build
+    for timetable in opened:
+        timetable.close()
+
+@pytest.fixture
+def timetable(build_timetable):
+    return build_timetable()
+
+@pytest.fixture
+def stub_api():
+    """Return a function starting a stub API server, as (StubAPI, base URL)
+
+    Its keyword arguments (latency, error_rate, error_status...) go to StubAPI.
+    """
+    servers = []
+
+    def start(**options):
+        api = StubAPI(*load_fixtures(), **options)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(api))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return api, f"http://127.0.0.1:{server.server_port}/v1"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,80 @@
+"""Tests for the connection cache's stale-while-revalidate, against the stub API"""
+
+import pytest
+
+import transit_time
+from transit_time import CONNECTION_CACHE_FRESH, ConnectionCache, TransportClient, get_connections
+
+LEAVING = "2026-06-01T08:00"
+
+@pytest.fixture
+def lookups(stub_api, tmp_path):
+    """Return a function installing a stub API client and a connection cache, as (StubAPI, cache)"""
+    caches = []
+
+    def install(**options):
+        api, url = stub_api(**options)
+        transit_time.set_client(TransportClient(url, rate_limit=0))
+        cache = ConnectionCache(str(tmp_path / "cache.sqlite"))
+        transit_time.set_connection_cache(cache)
+        caches.append(cache)
+        return api, cache
+
+    yield install
+    transit_time.set_connection_cache(None)
+    transit_time.set_client(None)
+    for cache in caches:
+        cache.close()
+
+def age(cache, seconds=CONNECTION_CACHE_FRESH + 60):
+    """Make every cached result older, as if stored `seconds` earlier"""
+    with cache.db:
+        cache.db.execute("UPDATE connections SET created = created - ?", (seconds,))
+
+def stored(path):
+    """Return (result, is_fresh) from a closed cache's file, for a query leaving at LEAVING"""
+    cache = ConnectionCache(path)
+    try:
+        return cache.get(cache.key("Nyon", "Lausanne", departure_time=LEAVING))
+    finally:
+        cache.close()
+
+def test_fresh_results_are_served_from_the_cache(lookups):
+    api, _ = lookups()
+    first = get_connections("Nyon", "Lausanne", departure_time=LEAVING)
+    assert first["status"] == "OK"
+    assert get_connections("Nyon", "Lausanne", departure_time=LEAVING) == first
+    assert api.counts["requests"] == 1
+
+def test_stale_results_are_served_then_refreshed_in_the_background(lookups, tmp_path):
+    api, cache = lookups(latency=0.2)
+    first = get_connections("Nyon", "Lausanne", departure_time=LEAVING)
+    age(cache)
+    # Answered at once from the stale entry, while the refresh waits for the API
+    assert get_connections("Nyon", "Lausanne", departure_time=LEAVING) == first
+    assert api.counts["requests"] == 1
+    # Closing waits for the refresh
+    cache.close()
+    assert api.counts["requests"] == 2
+    assert stored(str(tmp_path / "cache.sqlite")) == (first, True)
+
+def test_a_failed_refresh_keeps_the_stale_result(lookups, monkeypatch, tmp_path):
+    monkeypatch.setattr(transit_time, "THROTTLE_RETRIES", 0)
+    api, cache = lookups()
+    first = get_connections("Nyon", "Lausanne", departure_time=LEAVING)
+    age(cache)
+    api.error_rate = 1
+    assert get_connections("Nyon", "Lausanne", departure_time=LEAVING) == first
+    cache.close()
+    assert api.counts["errors"] == 1
+    assert stored(str(tmp_path / "cache.sqlite")) == (first, False)
+
+def test_stale_results_for_now_are_fetched_again_first(lookups):
+    # Departures leaving now may be gone from a stale answer
+    api, cache = lookups()
+    get_connections("Nyon", "Lausanne")
+    age(cache)
+    assert get_connections("Nyon", "Lausanne")["status"] == "OK"
+    assert api.counts["requests"] == 2
+    _, is_fresh = cache.get(cache.key("Nyon", "Lausanne"))
+    assert is_fresh
@@ -0,0 +1,47 @@
+"""Tests for importing a GTFS feed into a timetable store and reading it back"""
+
+from datetime import date
+
+from conftest import MONDAY, SUNDAY, tiny_feed
+
+def test_stops_and_stations(timetable):
+    header, rows = tiny_feed()["stops.txt"]
+    assert timetable.stop_count == len(rows)
+    assert [timetable.stop_name(stop) for stop in range(timetable.stop_count)] == [row[1] for row in rows]
+
+    # Swiss station numbers find the parent station, and it lists its platforms
+    rolle = timetable.find_stop("8501037")
+    assert timetable.stop_id(rolle) == "Parent8501037"
+    platforms = [timetable.stop_id(stop) for stop in timetable.station_stops(rolle)]
+    assert platforms == ["Parent8501037", "8501037:0:1", "8501037:0:2"]
+    assert timetable.find_stop("8599999") is None
+
+def test_connections_sorted_by_departure(timetable):
+    feed = tiny_feed()
+    trips = feed["trips.txt"][1]
+    stop_times = feed["stop_times.txt"][1]
+    assert timetable.trip_count == len(trips)
+    # One connection per pair of consecutive stops of each trip
+    assert len(timetable.conn_dep) == len(stop_times) - len(trips)
+    assert list(timetable.conn_dep) == sorted(timetable.conn_dep)
+    for c in range(len(timetable.conn_dep)):
+        assert timetable.conn_dep[c] <= timetable.conn_arr[c]
+
+def test_patterns_list_their_trips_in_departure_order(timetable):
+    for pattern in range(timetable.pattern_count):
+        first, last = timetable.pattern_trip_offsets[pattern], timetable.pattern_trip_offsets[pattern + 1]
+        departures = [timetable.st_dep[timetable.trip_st_offsets[trip]] for trip in range(first, last)]
+        assert departures == sorted(departures)
+        assert all(timetable.trip_pattern[trip] == pattern for trip in range(first, last))
+
+def test_services_follow_the_calendar(timetable):
+    assert all(timetable.active_trips(MONDAY))
+    assert not any(timetable.active_trips(SUNDAY))
+    # Removed by calendar_dates.txt, although a Friday
+    assert not any(timetable.active_trips(date(2026, 12, 25)))
+
+def test_footpaths_between_platforms(timetable):
+    first, second = timetable.find_stop("8501037:0:1"), timetable.find_stop("8501037:0:2")
+    start, end = timetable.footpath_offsets[first], timetable.footpath_offsets[first + 1]
+    footpaths = dict(zip(timetable.footpath_to[start:end], timetable.footpath_time[start:end]))
+    assert footpaths == {second: 180}
@@ -0,0 +1,19 @@
+"""Tests for the isochrone travel time grid"""
+
+import math
+
+import pytest
+
+from transit_time import travel_time_grid, walk_seconds
+
+def test_grid_walks_like_the_router():
+    pytest.importorskip("numpy")
+    # One stop reached after 5 minutes; walk from it for up to 15
+    grid, lat0, lon0, x_scale, west, south = travel_time_grid([(46.5, 6.5, 5.0)], 15, 100)
+    for row in range(grid.shape[0]):
+        for column in range(grid.shape[1]):
+            x, y = west + (column + 0.5) * 100, south + (row + 0.5) * 100
+            expected = 5 + walk_seconds(math.hypot(x, y)) / 60
+            assert grid[row, column] == pytest.approx(expected, abs=1 / 60)
+    # The grid ends where the walk from the stop takes more than 10 minutes
+    assert grid.min() >= 5 and grid[:, 0].min() > 14 and grid[0].min() > 14
@@ -0,0 +1,103 @@
+"""Tests for the offline router (CSA and RAPTOR) on the tiny feed"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from conftest import MONDAY, SUNDAY, tiny_feed, trips
+from transit_time import LocalRouter
+
+def at(hour, minute, day=MONDAY):
+    """An ISO time on a day the tiny feed runs"""
+    return f"{day.isoformat()}T{hour:02d}:{minute:02d}"
+
+def test_stops_for_concurrent_first_calls(build_timetable):
+    # Many stops ahead of the real ones keep the name table's build slow
+    header, rows = tiny_feed()["stops.txt"]
+    filler = [[f"9{i:06d}", f"Halt {i}", 46.0, 6.0, "", ""] for i in range(20000)]
+    router = LocalRouter(build_timetable(stops_txt=(header, filler + rows)))
+    start = threading.Barrier(8)
+
+    def find(_):
+        start.wait()
+        return router.stops_for("Bière")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        found = list(pool.map(find, range(8)))
+    assert found[0]
+    assert all(stops == found[0] for stops in found)
+
+def test_nearest_stops_counts_each_station_once(timetable):
+    # Rolle's parent station and two platforms are nearest, but the next station still counts
+    router = LocalRouter(timetable)
+    found = router.nearest_stops(46.4581, 6.3361, k=2, max_distance=10000)
+    ids = [timetable.stop_id(stop) for _, stop in found]
+    assert sorted(ids[:3]) == ["8501037:0:1", "8501037:0:2", "Parent8501037"]
+    assert ids[3:] == ["8501038"]
+    assert [metres for metres, _ in found] == sorted(metres for metres, _ in found)
+
+def test_raptor_boards_a_trip_overtaking_an_earlier_one(build_timetable):
+    # An express on the IR's stops leaves Nyon after the 07:00 IR but
+    # passes Gland before it, and reaches Morges at 07:16 instead of 07:25
+    feed = tiny_feed()
+    express_trips, express_times = trips("IR", "EX", 7 * 60 + 2, 7 * 60 + 2, 30,
+                                         [("8508005", 0), ("8501036", 3), ("8501037:0:1", 6),
+                                          ("8501038", 9), ("8501039", 14)])
+    header, rows = feed["trips.txt"]
+    st_header, st_rows = feed["stop_times.txt"]
+    router = LocalRouter(build_timetable(trips_txt=(header, rows + express_trips),
+                                         stop_times_txt=(st_header, st_rows + express_times)),
+                         pareto=True)
+
+    result = router.get_connections("Gland", "Morges", departure_time=at(7, 5))
+    assert result["status"] == "OK"
+    conn = result["connections"][0]
+    assert (conn.clock(conn.departure), conn.clock(conn.arrival)) == ("07:05", "07:16")
+
+def clocks(result):
+    """(departure, arrival, transfers) of each connection of a result"""
+    return [(conn.clock(conn.departure), conn.clock(conn.arrival), conn.transfers)
+            for conn in result["connections"]]
+
+def test_earliest_arrival_changes_platform(timetable):
+    result = LocalRouter(timetable).get_connections("Nyon", "Bière", departure_time=at(6, 0))
+    assert clocks(result) == [("06:00", "06:40", 1)]
+    sections = result["connections"][0].sections
+    assert [(s.transport, s.origin, s.destination) for s in sections] == [
+        ("IR 15", "Nyon", "Rolle"), ("B 725", "Rolle", "Bière")]
+
+def test_earliest_arrival_alternatives(timetable):
+    result = LocalRouter(timetable).get_connections("Nyon", "Bière", departure_time=at(6, 0), limit=3)
+    assert clocks(result) == [("06:00", "06:40", 1), ("06:30", "07:10", 1), ("07:00", "07:40", 1)]
+
+def test_latest_departure(timetable):
+    result = LocalRouter(timetable).get_connections("Nyon", "Bière", arrival_time=at(7, 15), limit=2)
+    assert clocks(result) == [("06:00", "06:40", 1), ("06:30", "07:10", 1)]
+
+def test_no_service_or_unknown_stop(timetable):
+    router = LocalRouter(timetable)
+    assert router.get_connections("Nyon", "Bière", departure_time=at(6, 0, SUNDAY))["status"] == "ERROR"
+    result = router.get_connections("Nyon", "Zermatt", departure_time=at(6, 0))
+    assert result == {"status": "ERROR", "message": "'Zermatt' is not in the local timetable"}
+
+def test_pareto_leaving_at(timetable):
+    # The direct S 99 needs no change but arrives 40 minutes after the IR and bus
+    result = LocalRouter(timetable, pareto=True).get_connections("Nyon", "Bière", departure_time=at(6, 0))
+    assert clocks(result) == [("06:00", "06:40", 1), ("06:00", "07:20", 0)]
+
+def test_pareto_arriving_by(timetable):
+    # Best first: the latest departure, then the one with fewer transfers
+    result = LocalRouter(timetable, pareto=True).get_connections("Nyon", "Bière", arrival_time=at(7, 25))
+    assert clocks(result) == [("06:30", "07:10", 1), ("06:00", "07:20", 0)]
+
+def test_pareto_without_a_faster_change(timetable):
+    # Along the IR alone there is nothing to trade
+    result = LocalRouter(timetable, pareto=True).get_connections("Nyon", "Morges", departure_time=at(6, 10))
+    assert clocks(result) == [("06:30", "06:55", 0)]
+
+def test_profile_keeps_only_undominated_departures(timetable):
+    router = LocalRouter(timetable)
+    journeys = router.profile(router.stops_for("Nyon"), router.stops_for("Bière"), MONDAY,
+                              6 * 3600, 7 * 3600)
+    # Every IR departure catches a bus; the S 99 at 06:00 and 07:00 is beaten by them
+    assert [(departure // 60, arrival // 60, transfers) for departure, arrival, transfers, _ in journeys] == [
+        (6 * 60, 6 * 60 + 40, 1), (6 * 60 + 30, 7 * 60 + 10, 1), (7 * 60, 7 * 60 + 40, 1)]
@@ -0,0 +1,78 @@
+"""Tests for sharing identical lookups in flight, against the stub API"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import transit_time
+from transit_time import SingleFlight, TransportClient
+
+@pytest.fixture
+def api(stub_api):
+    """The stub API, answering slowly enough for lookups to overlap, with a client pointed at it"""
+    api, url = stub_api(latency=0.3)
+    transit_time.set_client(TransportClient(url, rate_limit=0))
+    yield api
+    transit_time.set_client(None)
+
+def at_once(fn, n=8):
+    """Call fn(i) from n threads (i = 0 to n - 1) at the same time and return the results"""
+    start = threading.Barrier(n)
+
+    def call(i):
+        start.wait()
+        return fn(i)
+
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        return list(pool.map(call, range(n)))
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_identical_location_searches_share_one_request(api):
+    found = at_once(lambda _: transit_time.search_location("Lausanne"))
+    assert api.counts["requests"] == 1
+    assert all(location is found[0] for location in found)
+
+def test_identical_connection_lookups_share_one_request(api):
+    results = at_once(lambda _: transit_time.get_connections("Nyon", "Lausanne",
+                                                             departure_time="2026-06-01T08:00"))
+    assert api.counts["requests"] == 1
+    assert results[0]["status"] == "OK"
+    assert all(result is results[0] for result in results)
+
+def test_different_lookups_are_not_shared(api):
+    names = ["Nyon", "Rolle", "Gland", "Morges"]
+    found = at_once(lambda i: transit_time.search_location(names[i]), len(names))
+    assert api.counts["requests"] == len(names)
+    assert [location.name for location in found] == names
+
+def test_followers_get_the_leaders_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait()
+        raise ValueError("API down")
+
+    def call():
+        try:
+            flight.do("key", fail)
+        except ValueError as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(call) for _ in range(4)]
+        wait_for(lambda: flight.counters["shared"] == 3)
+        release.set()
+        errors = [future.result() for future in futures]
+    assert all(error is errors[0] for error in errors) and str(errors[0]) == "API down"
+    assert flight.counters == {"calls": 1, "shared": 3}
+    # Nothing is left in flight: the next call runs again
+    assert flight.do("key", lambda: "ok") == "ok"
+    assert flight.counters["calls"] == 2
@@ -0,0 +1,107 @@
+"""Tests for the offline station name index and its place in search_location()"""
+
+import pytest
+
+from stub_server import load_fixtures
+import transit_time
+from transit_time import Location, StationIndex, fold_name
+
+@pytest.fixture
+def fixture_index():
+    """An index of the stations in the benchmarks' canned API responses"""
+    locations, _ = load_fixtures()
+    return StationIndex(Location.from_api(station)
+                        for response in locations.values() for station in response["stations"])
+
+@pytest.fixture
+def lookups():
+    """Leave no cache, index or client installed for other tests"""
+    yield
+    transit_time.set_station_index(None)
+    transit_time.set_location_cache(None)
+    transit_time.set_client(None)
+
+def test_fold_name():
+    assert fold_name("Meyrin, Bergère") == fold_name("meyrin bergere") == "meyrin bergere"
+    assert fold_name("  Zürich   HB ") == "zurich hb"
+
+def test_lookup_ignores_accents_case_and_punctuation(fixture_index):
+    assert fixture_index.lookup("meyrin bergere").name == "Meyrin, Bergère"
+    assert fixture_index.lookup("ZURICH HB").name == "Zürich HB"
+    assert fixture_index.lookup("Geneve").name == "Genève"
+
+def test_lookup_tolerates_typos(fixture_index):
+    assert fixture_index.lookup("Lausane").name == "Lausanne"
+    assert fixture_index.lookup("Geneve Aeroprt").name == "Genève-Aéroport"
+    assert fixture_index.lookup("Renens").name == "Renens VD"
+
+def test_lookup_leaves_unlike_names_to_the_api(fixture_index):
+    assert fixture_index.lookup("Rue de la Gare 3, Renens") is None
+    assert fixture_index.lookup("Zermatt") is None
+
+def test_lookup_leaves_longer_names_to_the_api(fixture_index):
+    # Stops of their own, not Lausanne station: each word of the query must match
+    assert fixture_index.lookup("Lausanne Flon") is None
+    assert fixture_index.lookup("Lausanne-Flon") is None
+    assert fixture_index.lookup("Lausanne Ouchy") is None
+
+def test_search_ranks_exact_names_first(fixture_index):
+    matches = fixture_index.search("Genève")
+    assert matches[0] == (1.0, fixture_index.lookup("Genève"))
+    assert [location.name for _, location in matches[:2]] == ["Genève", "Genève-Aéroport"]
+
+def test_stations_are_indexed_once(fixture_index):
+    # Several queries in the fixtures answer with the same station
+    names = [location.name for location in fixture_index.locations]
+    assert len(names) == len(set(names))
+
+def test_from_timetable_indexes_stations_not_platforms(timetable):
+    index = StationIndex.from_timetable(timetable)
+    assert sorted(location.name for location in index.locations) == [
+        "Allaman", "Aubonne", "Bière", "Gland", "Morges", "Nyon", "Rolle"]
+    # The parent station's GTFS id becomes the Swiss station number
+    rolle = index.lookup("rolle")
+    assert (rolle.id, rolle.x, rolle.y) == ("8501037", 46.458, 6.336)
+
+def test_search_location_builds_the_index_on_first_use(lookups, timetable):
+    built = []
+
+    def build():
+        built.append(True)
+        return StationIndex.from_timetable(timetable)
+
+    transit_time.set_station_index(build)
+    assert not built
+    assert transit_time.search_location("Biere").name == "Bière"
+    assert transit_time.search_location("Nyon").name == "Nyon"
+    assert built == [True]
+
+def test_search_location_asks_the_cache_before_the_index(lookups, timetable, tmp_path):
+    cache = transit_time.LocationCache(str(tmp_path / "cache.sqlite"))
+    cache.put("Morges", Location(name="Morges (cached)", id="8501039").to_dict())
+    transit_time.set_location_cache(cache)
+    transit_time.set_station_index(StationIndex.from_timetable(timetable))
+    try:
+        assert transit_time.search_location("Morges").name == "Morges (cached)"
+        # Exact index hits are cached for the next run, fuzzy ones aren't
+        assert transit_time.search_location("Aubonne").name == "Aubonne"
+        assert cache.get("Aubonne")["id"] == "8501040"
+        assert transit_time.search_location("Aubone").name == "Aubonne"
+        assert cache.get("Aubone") is None
+    finally:
+        cache.close()
+
+def test_search_location_sends_longer_names_to_the_api(lookups, stub_api, tmp_path):
+    _, url = stub_api()
+    cache = transit_time.LocationCache(str(tmp_path / "cache.sqlite"))
+    transit_time.set_client(transit_time.TransportClient(url, rate_limit=0))
+    transit_time.set_location_cache(cache)
+    try:
+        lausanne = transit_time.search_location("Lausanne")
+        # Lausanne is now in the cache, and the index it adds to
+        transit_time.set_station_index(StationIndex([lausanne]))
+        flon = transit_time.search_location("Lausanne Flon")
+        assert flon.name == "Lausanne Flon" and flon.id != lausanne.id
+        assert cache.get("Lausanne Flon")["id"] == flon.id
+    finally:
+        cache.close()
@@ -0,0 +1,14 @@
+"""Tests for the --stats timings"""
+
+from transit_time import Stats
+
+def test_phases_keep_a_bounded_window_of_timings():
+    stats = Stats(samples=100)
+    for ms in range(1, 1001):
+        stats.add("api connections", ms / 1000, size=10)
+    assert len(stats.timings["api connections"]) == 100
+    # Counts, totals and maximums still cover every step; percentiles the recent ones
+    phase = stats.summary()["phases"]["api connections"]
+    assert (phase["count"], phase["total_ms"], phase["max_ms"]) == (1000, 500500, 1000)
+    assert phase["p50_ms"] == 951
+    assert phase["bytes"] == 10000
@@ -0,0 +1,137 @@
+"""Tests for the API client's rate limits, backoff, retries and hedging, against the stub API"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+import transit_time
+from transit_time import AdaptiveConcurrency, RateLimiter, TransportClient
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_rate_limiter_spaces_requests():
+    limiter = RateLimiter(20, burst=1)
+    started = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+    # The first token is there already, the other five come every 50 ms
+    assert time.monotonic() - started >= 0.24
+
+def test_adaptive_concurrency_halves_once_per_round_trip():
+    concurrency = AdaptiveConcurrency(16, initial=8)
+    # Four requests in flight together are all throttled: one decrease
+    started = [concurrency.acquire() for _ in range(4)]
+    for start in started:
+        concurrency.release(start, ok=False)
+    assert concurrency.limit == 4
+    # A request sent after the decrease halves it again, successes raise it slowly
+    concurrency.release(concurrency.acquire(), ok=False)
+    assert concurrency.limit == 2
+    for _ in range(4):
+        concurrency.release(concurrency.acquire(), ok=True)
+    assert 3 < concurrency.limit < 4
+
+def test_throttled_requests_wait_for_retry_after(stub_api):
+    # The stub asks to retry after 1 second
+    api, url = stub_api(error_rate=1, error_status=429)
+    client = TransportClient(url, rate_limit=50)
+    try:
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            started = time.monotonic()
+            future = pool.submit(client.get, "locations", {"query": "Nyon"})
+            wait_for(lambda: api.counts["requests"] == 1)
+            api.error_rate = 0
+            assert future.result()["stations"][0]["name"] == "Nyon"
+        assert time.monotonic() - started >= 1
+        assert api.counts == {"requests": 2, "errors": 1, "bytes": api.counts["bytes"]}
+        assert client.counters["throttled"] == 1
+        assert client.concurrency.limit < transit_time.INITIAL_CONCURRENCY
+    finally:
+        client.close()
+
+def test_a_pause_holds_back_every_thread(stub_api):
+    api, url = stub_api(error_rate=1, error_status=429)
+    client = TransportClient(url, rate_limit=50)
+    try:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            throttled = pool.submit(client.get, "locations", {"query": "Nyon"})
+            wait_for(lambda: client.limiter.paused_until > 0)
+            api.error_rate = 0
+            # Sent during the pause, so it waits too although nothing throttled it
+            started = time.monotonic()
+            other = pool.submit(client.get, "locations", {"query": "Rolle"})
+            assert other.result()["stations"][0]["name"] == "Rolle"
+            assert time.monotonic() - started >= 0.8
+            throttled.result()
+    finally:
+        client.close()
+
+def test_throttling_gives_up_after_the_last_retry(stub_api, monkeypatch):
+    monkeypatch.setattr(transit_time, "THROTTLE_RETRIES", 1)
+    api, url = stub_api(error_rate=1, error_status=429)
+    client = TransportClient(url, rate_limit=50)
+    try:
+        with pytest.raises(requests.HTTPError):
+            client.get("locations", {"query": "Nyon"})
+        assert api.counts["requests"] == 2
+        assert client.counters["throttled"] == 2
+    finally:
+        client.close()
+
+def slow_first_request(api, seconds):
+    """Delay only the request the stub is about to receive"""
+    api.latency = seconds
+    # Each request reads the latency when it arrives
+    time.sleep(0.1)
+    api.latency = 0
+
+def test_timeouts_are_retried(stub_api, monkeypatch):
+    monkeypatch.setattr(transit_time, "RETRY_BACKOFF", 0.01)
+    api, url = stub_api()
+    client = TransportClient(url, rate_limit=0, timeout=(1, 0.3))
+    try:
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            future = pool.submit(client.get, "locations", {"query": "Nyon"})
+            slow_first_request(api, 1)
+            assert future.result()["stations"][0]["name"] == "Nyon"
+        assert client.counters["retries"] == 1
+    finally:
+        client.close()
+
+def test_retries_give_up_with_the_error(stub_api, monkeypatch):
+    monkeypatch.setattr(transit_time, "RETRY_BACKOFF", 0.01)
+    api, url = stub_api(latency=0.5)
+    client = TransportClient(url, rate_limit=0, timeout=(1, 0.1), retries=2)
+    try:
+        with pytest.raises(requests.Timeout):
+            client.get("locations", {"query": "Nyon"})
+        assert client.counters["retries"] == 2
+        wait_for(lambda: api.counts["requests"] == 3)
+    finally:
+        client.close()
+
+def test_a_slow_request_is_hedged(stub_api, monkeypatch):
+    monkeypatch.setattr(transit_time, "HEDGE_DELAY", 0.2)
+    api, url = stub_api()
+    client = TransportClient(url, rate_limit=0, hedge=True)
+    try:
+        # Answered quickly: no hedge
+        assert client.get("locations", {"query": "Nyon"})["stations"]
+        assert client.counters["hedged"] == 0
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            started = time.monotonic()
+            future = pool.submit(client.get, "locations", {"query": "Rolle"})
+            slow_first_request(api, 2)
+            assert future.result()["stations"][0]["name"] == "Rolle"
+        # The hedge, sent after 0.2 seconds, answered long before the first request
+        assert time.monotonic() - started < 1
+        assert (client.counters["hedged"], client.counters["hedge_wins"]) == (1, 1)
+    finally:
+        client.close()
@@ -5,12 +5,29 @@ Calculate travel times to Lausanne Gare and Rue de la Bergère 2, Meyrin
 Uses the free Swiss public transport API - no API key required!
 """
 
+import os
+import random
+import io
+import csv
 import sys
-import requests
+import mmap
 import json
-from datetime import datetime
+import math
+import sqlite3
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
 import argparse
+import bisect
+import contextlib
 import urllib.parse
+from array import array
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from itertools import repeat
 
 # ANSI color codes
 class Colors:
@@ -30,101 +47,1651 @@ DEFAULT_DESTINATIONS = {
     "Meyrin, Rue de la Bergère": "Meyrin, Bergère"  # Simplified for API search
 }
 
+# Number of destinations looked up in parallel
+DEFAULT_JOBS = 8
+
+# Most connections the API returns per request (more are fetched page by page)
+API_MAX_LIMIT = 16
+
+# Connection fields requested from the API for each output mode. Asking only
+# for these keeps the API from sending every intermediate stop of every
+# section. None means the full connection objects.
+SUMMARY_FIELDS = [
+    "connections/from/departure",
+    "connections/from/departureTimestamp",
+    "connections/to/arrivalTimestamp",
+    "connections/to/arrival",
+    "connections/transfers",
+]
+CONNECTION_FIELDS = {
+    "summary": SUMMARY_FIELDS,
+    "detailed": SUMMARY_FIELDS + [
+        "connections/sections/journey/category",
+        "connections/sections/journey/number",
+        "connections/sections/journey/name",
+        "connections/sections/walk/duration",
+        "connections/sections/departure/station/name",
+        "connections/sections/departure/departureTimestamp",
+        "connections/sections/departure/platform",
+        "connections/sections/arrival/station/name",
+        "connections/sections/arrival/arrivalTimestamp",
+    ],
+}
+
+# Requests per second sent to the API, by the matrix and isochrone commands and by default
+DEFAULT_MATRIX_RATE = 5
+DEFAULT_API_RATE = 10
+
+# Requests in flight start at INITIAL_CONCURRENCY and adapt between 1 and the pool size
+INITIAL_CONCURRENCY = 4
+
+# How often a throttled (HTTP 429) or overloaded (5xx) request is tried again,
+# how long to pause when the API doesn't say (doubling each time), and the
+# longest Retry-After honoured, in seconds
+THROTTLE_RETRIES = 3
+THROTTLE_BACKOFF = 1.0
+MAX_RETRY_AFTER = 120
+
+# Seconds to wait for the API to accept a connection, and then for each read
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+
+# Requests failing with a network error or timeout are tried again this many
+# times, after a random pause of up to RETRY_BACKOFF * 2^attempt seconds
+NETWORK_RETRIES = 2
+RETRY_BACKOFF = 0.5
+
+# With hedging, a duplicate request is sent once the first has taken longer
+# than 95% of recent requests (or HEDGE_DELAY until enough have been timed)
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 20
+HEDGE_DELAY = 1.0
+
+# Swiss transport API
+API_BASE_URL = "http://transport.opendata.ch/v1"
+
+# Keep-alive connections held open per API host
+DEFAULT_POOL_SIZE = DEFAULT_JOBS
+
+class RateLimiter:
+    """Token bucket limiting how many requests may start per second"""
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        # Nothing is sent before this time, e.g. after the API asked us to retry later
+        self.paused_until = 0
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+    
+    def pause(self, seconds):
+        """Hold back every request for a while, and start again with an empty bucket"""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+            self.updated = self.paused_until
+
+class AdaptiveConcurrency:
+    """Cap on requests in flight, adapted AIMD-style
+    
+    Each successful request raises the limit by 1/limit (about one more
+    request per round trip); a throttled or failed one halves it, at most
+    once for the requests that were in flight together.
+    """
+    def __init__(self, maximum, initial=INITIAL_CONCURRENCY, minimum=1):
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.in_flight = 0
+        self.decreased = 0
+        self.condition = threading.Condition()
+    
+    def acquire(self):
+        """Block until a request may start; returns the start time to pass to release()"""
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+            return time.monotonic()
+    
+    def release(self, started, ok):
+        """Record how a request that started at `started` went"""
+        with self.condition:
+            self.in_flight -= 1
+            if ok:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            elif started >= self.decreased:
+                # Requests sent before the last decrease already paid for it
+                self.limit = max(self.minimum, self.limit / 2)
+                self.decreased = time.monotonic()
+            self.condition.notify_all()
+
+def percentile(samples, p):
+    """Return the p-th percentile of a sorted, non-empty list"""
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+# Timings kept per phase for the --stats percentiles; a long-running serve
+# keeps only the most recent ones, with exact counts, totals and maximums
+STATS_SAMPLES = 10000
+
+class Stats:
+    """Timings, byte counts and event counts for each phase of a run, for --stats"""
+    def __init__(self, samples=STATS_SAMPLES):
+        self.samples = samples
+        self.timings = {}
+        # Phase -> [count, total seconds, longest seconds] of every step
+        self.totals = {}
+        self.bytes = {}
+        self.counts = {}
+        self.lock = threading.Lock()
+    
+    def add(self, phase, seconds, size=None):
+        """Record one timed step of a phase, and optionally how many bytes it moved"""
+        with self.lock:
+            timings = self.timings.get(phase)
+            if timings is None:
+                timings = self.timings[phase] = deque(maxlen=self.samples)
+                self.totals[phase] = [0, 0.0, 0.0]
+            timings.append(seconds)
+            totals = self.totals[phase]
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] = max(totals[2], seconds)
+            if size is not None:
+                self.bytes[phase] = self.bytes.get(phase, 0) + size
+    
+    @contextlib.contextmanager
+    def timed(self, phase):
+        """Time the body of a with statement as one step of a phase"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(phase, time.monotonic() - started)
+    
+    def count(self, event, n=1):
+        """Count an event, such as a cache hit"""
+        with self.lock:
+            self.counts[event] = self.counts.get(event, 0) + n
+    
+    def summary(self):
+        """Return the statistics as a JSON-friendly dict, with times in milliseconds"""
+        with self.lock:
+            timings = {phase: sorted(samples) for phase, samples in self.timings.items()}
+            phases = {}
+            for phase, samples in timings.items():
+                count, total, longest = self.totals[phase]
+                phases[phase] = {
+                    "count": count,
+                    "total_ms": round(total * 1000, 3),
+                    "p50_ms": round(percentile(samples, 50) * 1000, 3),
+                    "p95_ms": round(percentile(samples, 95) * 1000, 3),
+                    "max_ms": round(longest * 1000, 3)
+                }
+                if phase in self.bytes:
+                    phases[phase]["bytes"] = self.bytes[phase]
+            return {"phases": phases, "counts": dict(self.counts)}
+    
+    def report(self, out=sys.stderr):
+        """Print a table of the phases and the counts"""
+        summary = self.summary()
+        print(f"\n📊 {'Phase':<24} {'Count':>6} {'Total ms':>10} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'Max ms':>8} {'Bytes':>9}", file=out)
+        for phase, row in sorted(summary["phases"].items(), key=lambda item: -item[1]["total_ms"]):
+            print(f"   {phase:<24} {row['count']:>6} {row['total_ms']:>10.1f} {row['p50_ms']:>8.1f} "
+                  f"{row['p95_ms']:>8.1f} {row['max_ms']:>8.1f} {row.get('bytes', ''):>9}", file=out)
+        for event, n in sorted(summary["counts"].items()):
+            print(f"   {event:<24} {n:>6}", file=out)
+
+# Always collected (it costs well under a microsecond per step); shown with --stats
+_stats = Stats()
+
+class LatencyTracker:
+    """Durations of the most recent requests, for percentiles"""
+    def __init__(self, size=200):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+    
+    def add(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+    
+    def percentile(self, p, default=None, min_samples=1):
+        """Return the p-th percentile, or default with fewer than min_samples samples"""
+        with self.lock:
+            samples = sorted(self.samples)
+        if len(samples) < max(1, min_samples):
+            return default
+        return percentile(samples, p)
+
+def retry_after(response, default):
+    """Return how many seconds a throttled response asks us to wait"""
+    value = response.headers.get("Retry-After")
+    if value:
+        try:
+            seconds = float(value)
+        except ValueError:
+            import email.utils
+            try:
+                seconds = (email.utils.parsedate_to_datetime(value) - datetime.now().astimezone()).total_seconds()
+            except (TypeError, ValueError):
+                seconds = default
+        return min(max(seconds, 0), MAX_RETRY_AFTER)
+    return default
+
+class TransportClient:
+    """HTTP client for the Swiss transport API using a pooled keep-alive session"""
+    def __init__(self, base_url=API_BASE_URL, pool_size=DEFAULT_POOL_SIZE, max_hosts=4, session=None,
+                 rate_limit=DEFAULT_API_RATE, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                 retries=NETWORK_RETRIES, hedge=False):
+        self.base_url = base_url.rstrip("/")
+        # (connect, read) timeouts in seconds, passed to every request
+        self.timeout = timeout
+        self.retries = retries
+        self.latency = LatencyTracker()
+        # Hedged requests run on their own threads so the first answer can be taken
+        self.hedge_pool = ThreadPoolExecutor(max_workers=2 * pool_size) if hedge else None
+        # Every request from every thread takes a token from one bucket
+        self.limiter = RateLimiter(rate_limit) if rate_limit else None
+        self.concurrency = AdaptiveConcurrency(pool_size)
+        self.pool_size = pool_size
+        self.max_hosts = max_hosts
+        # Created on first use, so runs answered from the cache never import requests
+        self._session = session
+        self.session_lock = threading.Lock()
+        self.counters = {"requests": 0, "bytes": 0, "throttled": 0, "retries": 0, "hedged": 0,
+                         "hedge_wins": 0}
+        self.counters_lock = threading.Lock()
+    
+    @property
+    def session(self):
+        """The pooled keep-alive requests session"""
+        if self._session is None:
+            with self.session_lock:
+                if self._session is None:
+                    import requests
+                    session = requests.Session()
+                    # pool_maxsize caps the sockets per host; pool_block makes extra
+                    # callers wait for a free socket instead of opening throwaway ones
+                    adapter = requests.adapters.HTTPAdapter(pool_connections=self.max_hosts,
+                                                            pool_maxsize=self.pool_size,
+                                                            pool_block=True)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
+    
+    def get(self, endpoint, params=None):
+        """Fetch an API endpoint (e.g. 'locations') and return the decoded JSON"""
+        response = self.request(endpoint, params)
+        if response.status_code == 429 or response.status_code >= 500:
+            response.raise_for_status()
+        with _stats.timed("json decode"):
+            return response.json()
+    
+    def request(self, endpoint, params=None):
+        """Fetch an API endpoint and return the raw response
+        
+        Throttled (429) and overloaded (5xx) responses make every thread wait
+        for Retry-After (or an exponential backoff) and are tried again up to
+        THROTTLE_RETRIES times; the last response is returned either way.
+        Network errors and timeouts are retried after a jittered backoff, and
+        raised once `retries` retries have failed too.
+        """
+        import requests
+        throttled = failed = 0
+        while True:
+            try:
+                if self.hedge_pool is not None:
+                    response = self.send_hedged(endpoint, params)
+                else:
+                    response = self.send(endpoint, params)
+            except (requests.ConnectionError, requests.Timeout):
+                if failed >= self.retries:
+                    raise
+                # Full jitter, so clients that failed together don't retry together
+                time.sleep(random.uniform(0, RETRY_BACKOFF * 2 ** failed))
+                failed += 1
+                with self.counters_lock:
+                    self.counters["retries"] += 1
+                continue
+            
+            if response.status_code != 429 and response.status_code < 500:
+                return response
+            with self.counters_lock:
+                self.counters["throttled"] += 1
+            if throttled == THROTTLE_RETRIES:
+                return response
+            
+            delay = retry_after(response, THROTTLE_BACKOFF * 2 ** throttled)
+            throttled += 1
+            if self.limiter is not None:
+                self.limiter.pause(delay)
+            else:
+                time.sleep(delay)
+    
+    def send(self, endpoint, params=None):
+        """Send one request, within the rate and concurrency limits"""
+        if self.limiter is not None:
+            self.limiter.acquire()
+        started = self.concurrency.acquire()
+        ok = False
+        try:
+            response = self.session.get(f"{self.base_url}/{endpoint}", params=params,
+                                        timeout=self.timeout)
+            ok = response.status_code != 429 and response.status_code < 500
+        finally:
+            self.concurrency.release(started, ok)
+        
+        elapsed = time.monotonic() - started
+        if ok:
+            self.latency.add(elapsed)
+        _stats.add(f"api {endpoint}", elapsed, len(response.content))
+        with self.counters_lock:
+            self.counters["requests"] += 1
+            self.counters["bytes"] += len(response.content)
+        return response
+    
+    def send_hedged(self, endpoint, params=None):
+        """Send a request, and a duplicate if it is slower than usual; return whichever answers first"""
+        primary = self.hedge_pool.submit(self.send, endpoint, params)
+        delay = self.latency.percentile(HEDGE_PERCENTILE, HEDGE_DELAY, HEDGE_MIN_SAMPLES)
+        try:
+            return primary.result(timeout=delay)
+        except FutureTimeout:
+            pass
+        
+        hedge = self.hedge_pool.submit(self.send, endpoint, params)
+        with self.counters_lock:
+            self.counters["hedged"] += 1
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        with self.counters_lock:
+                            self.counters["hedge_wins"] += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+    
+    def close(self):
+        if self.hedge_pool is not None:
+            self.hedge_pool.shutdown(wait=False)
+        if self._session is not None:
+            self._session.close()
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Return the shared API client, creating it on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = TransportClient()
+        return _client
+
+def set_client(client):
+    """Replace the shared API client, e.g. with one pointing at a local stub server"""
+    global _client
+    with _client_lock:
+        previous, _client = _client, client
+    if previous is not None and previous is not client:
+        previous.close()
+
+# Slotted dataclasses where the Python version supports them (3.10+)
+SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(frozen=True, **SLOTS)
+class Location:
+    """A resolved place: a station with an id, or an address known only by its coordinates"""
+    name: str
+    id: str = None
+    # WGS84 coordinates as returned by the API (x is the latitude, y the longitude)
+    x: float = None
+    y: float = None
+    type: str = "station"
+    
+    @classmethod
+    def from_api(cls, station):
+        """Build a Location from an entry of the API's 'stations' list"""
+        coordinate = station.get("coordinate") or {}
+        return cls(name=station["name"],
+                   id=station.get("id"),
+                   x=coordinate.get("x"),
+                   y=coordinate.get("y"),
+                   type=station.get("type") or ("station" if station.get("id") else "address"))
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Build a Location from the dict produced by to_dict()"""
+        return cls.from_api(data)
+    
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "type": self.type,
+            "coordinate": {"type": "WGS84", "x": self.x, "y": self.y}
+        }
+    
+    @property
+    def api_value(self):
+        """The from/to value for the connections API: id, else coordinates, else name"""
+        if self.id:
+            return self.id
+        if self.x is not None and self.y is not None:
+            return f"{self.x},{self.y}"
+        return self.name
+
+def location_param(location):
+    """Turn a Location (or a plain name) into a from/to API parameter"""
+    if isinstance(location, Location):
+        return location.api_value
+    return location
+
+EPOCH = datetime(1970, 1, 1)
+
+def parse_timestamp(value):
+    """Turn an ISO 8601 time into (seconds since the epoch, UTC offset in seconds)
+    
+    Times without an offset, like the local timetable's, are taken as UTC
+    and get an offset of None.
+    """
+    when = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    offset = when.utcoffset()
+    if offset is None:
+        return int((when - EPOCH).total_seconds()), None
+    return int(when.timestamp()), int(offset.total_seconds())
+
+def checkpoint_time(checkpoint, key):
+    """Seconds since the epoch of an API checkpoint's 'departure' or 'arrival', or None"""
+    seconds = checkpoint.get(f"{key}Timestamp")
+    if seconds is not None:
+        return seconds
+    value = checkpoint.get(key)
+    return parse_timestamp(value)[0] if value else None
+
+def local_clock(seconds, utc_offset=None):
+    """Format seconds since the epoch as HH:MM in a time zone given by its UTC offset"""
+    minutes = (seconds + (utc_offset or 0)) // 60
+    return f"{minutes // 60 % 24:02d}:{minutes % 60:02d}"
+
+@dataclass(**SLOTS)
+class Section:
+    """One leg of a connection: a ride, or a walk (category 'Walk')"""
+    category: str
+    origin: str = ""
+    destination: str = ""
+    # Seconds since the epoch, for rides
+    departure: int = None
+    arrival: int = None
+    # Seconds spent on this leg
+    duration: int = 0
+    number: str = ""
+    name: str = ""
+    platform: str = ""
+    
+    @property
+    def is_walk(self):
+        return self.category == "Walk"
+    
+    @property
+    def transport(self):
+        """The category and number, e.g. 'IR 1419'"""
+        return f"{self.category} {self.number}".strip()
+    
+    def to_dict(self):
+        return {"category": self.category, "origin": self.origin, "destination": self.destination,
+                "departure": self.departure, "arrival": self.arrival, "duration": self.duration,
+                "number": self.number, "name": self.name, "platform": self.platform}
+    
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+@dataclass(**SLOTS)
+class Connection:
+    """One journey, with its times parsed once into seconds since the epoch"""
+    departure: int
+    arrival: int
+    transfers: int = 0
+    sections: tuple = ()
+    # Offset of the journey's local time from UTC in seconds; None when the
+    # times are local already (the local timetable has no time zone)
+    utc_offset: int = None
+    # Seconds from departure to arrival
+    duration: int = field(init=False)
+    
+    def __post_init__(self):
+        self.duration = self.arrival - self.departure
+    
+    @property
+    def duration_text(self):
+        """The duration as e.g. '27min' or '1h 11min'"""
+        return format_duration(self.duration // 60)
+    
+    def local_time(self, seconds):
+        """A departure or arrival of this journey as a naive local datetime"""
+        return EPOCH + timedelta(seconds=seconds + (self.utc_offset or 0))
+    
+    def clock(self, seconds):
+        """A departure or arrival of this journey as local HH:MM"""
+        return local_clock(seconds, self.utc_offset)
+    
+    def isoformat(self, seconds):
+        """A departure or arrival of this journey in ISO 8601, with its UTC offset if known"""
+        when = self.local_time(seconds)
+        if self.utc_offset is None:
+            return when.isoformat()
+        return when.replace(tzinfo=timezone(timedelta(seconds=self.utc_offset))).isoformat()
+    
+    def to_dict(self):
+        return {"departure": self.departure, "arrival": self.arrival, "transfers": self.transfers,
+                "sections": [section.to_dict() for section in self.sections],
+                "utc_offset": self.utc_offset}
+    
+    @classmethod
+    def from_dict(cls, data):
+        return cls(departure=data["departure"], arrival=data["arrival"], transfers=data["transfers"],
+                   sections=tuple(Section.from_dict(section) for section in data["sections"]),
+                   utc_offset=data["utc_offset"])
+
+def encode_result(result):
+    """Turn a get_connections() result into plain JSON-ready values"""
+    if result.get("status") != "OK":
+        return result
+    return {"status": "OK", "connections": [conn.to_dict() for conn in result["connections"]]}
+
+def decode_result(data):
+    """Inverse of encode_result()"""
+    if data.get("status") != "OK":
+        return data
+    return {"status": "OK", "connections": [Connection.from_dict(conn) for conn in data["connections"]]}
+
+# Resolved locations hardly ever change, so keep them for a month
+LOCATION_CACHE_TTL = 30 * 24 * 3600
+LOCATION_CACHE_MAX_ENTRIES = 2000
+
+# Connection results are grouped into time buckets of this many minutes.
+# Within FRESH seconds a cached result is returned as is; up to STALE seconds
+# it is still returned immediately but refreshed in the background.
+CONNECTION_CACHE_BUCKET = 5
+CONNECTION_CACHE_FRESH = 5 * 60
+CONNECTION_CACHE_STALE = 60 * 60
+CONNECTION_CACHE_MAX_ENTRIES = 5000
+# Part of every connection cache key; bumped when the stored results change shape
+CONNECTION_CACHE_VERSION = 2
+
+def default_cache_dir():
+    """Return the per-user cache directory for this tool"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "transit_time")
+
+def open_cache_db(path):
+    """Open (creating if needed) the SQLite file shared by the lookup caches"""
+    if path is None:
+        path = os.path.join(default_cache_dir(), "cache.sqlite")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return sqlite3.connect(path, timeout=5, check_same_thread=False)
+
+def normalize_query(query):
+    """Normalize a search string so trivially different spellings share a cache entry"""
+    return " ".join(query.casefold().split())
+
+class LocationCache:
+    """Persistent SQLite cache of search_location results with TTL and LRU eviction"""
+    def __init__(self, path=None, ttl=LOCATION_CACHE_TTL, max_entries=LOCATION_CACHE_MAX_ENTRIES,
+                 refresh=False):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # When refreshing, stored entries are ignored but new results are still written
+        self.refresh = refresh
+        self.lock = threading.Lock()
+        self.db = open_cache_db(path)
+        with self.db:
+            self.db.execute("""CREATE TABLE IF NOT EXISTS locations (
+                                   query TEXT PRIMARY KEY,
+                                   data TEXT NOT NULL,
+                                   created REAL NOT NULL,
+                                   last_used REAL NOT NULL)""")
+            self.db.execute("CREATE INDEX IF NOT EXISTS locations_last_used ON locations (last_used)")
+    
+    def get(self, query):
+        """Return the cached location for a query, or None if missing or expired"""
+        if self.refresh:
+            return None
+        
+        key = normalize_query(query)
+        now = time.time()
+        try:
+            with self.lock, self.db:
+                row = self.db.execute("SELECT data, created FROM locations WHERE query = ?",
+                                      (key,)).fetchone()
+                if row is None:
+                    return None
+                if now - row[1] > self.ttl:
+                    self.db.execute("DELETE FROM locations WHERE query = ?", (key,))
+                    return None
+                self.db.execute("UPDATE locations SET last_used = ? WHERE query = ?", (now, key))
+            return json.loads(row[0])
+        except sqlite3.Error:
+            return None
+    
+    def put(self, query, location):
+        """Store a resolved location, evicting the least recently used entries if full"""
+        now = time.time()
+        try:
+            with self.lock, self.db:
+                self.db.execute("INSERT OR REPLACE INTO locations VALUES (?, ?, ?, ?)",
+                                (normalize_query(query), json.dumps(location), now, now))
+                count = self.db.execute("SELECT COUNT(*) FROM locations").fetchone()[0]
+                if count > self.max_entries:
+                    self.db.execute("""DELETE FROM locations WHERE query IN (
+                                           SELECT query FROM locations
+                                           ORDER BY last_used LIMIT ?)""",
+                                    (count - self.max_entries,))
+        except sqlite3.Error:
+            pass
+    
+    def stations(self):
+        """Return the cached locations that are stations, as dicts for Location.from_dict()"""
+        try:
+            with self.lock:
+                rows = self.db.execute("SELECT data FROM locations").fetchall()
+        except sqlite3.Error:
+            return []
+        stations = (json.loads(data) for data, in rows)
+        return [station for station in stations if station.get("type") == "station" and station.get("id")]
+    
+    def close(self):
+        self.db.close()
+
+class ConnectionCache:
+    """Persistent SQLite cache of get_connections results with stale-while-revalidate"""
+    def __init__(self, path=None, bucket_minutes=CONNECTION_CACHE_BUCKET,
+                 fresh=CONNECTION_CACHE_FRESH, stale=CONNECTION_CACHE_STALE,
+                 max_entries=CONNECTION_CACHE_MAX_ENTRIES):
+        self.bucket_minutes = bucket_minutes
+        self.fresh = fresh
+        self.stale = stale
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.refreshing = set()
+        self.refresher = ThreadPoolExecutor(max_workers=2)
+        self.db = open_cache_db(path)
+        with self.db:
+            self.db.execute("""CREATE TABLE IF NOT EXISTS connections (
+                                   key TEXT PRIMARY KEY,
+                                   data TEXT NOT NULL,
+                                   created REAL NOT NULL,
+                                   last_used REAL NOT NULL)""")
+            self.db.execute("CREATE INDEX IF NOT EXISTS connections_last_used ON connections (last_used)")
+            # Drop everything too old to be served, even as stale
+            purged = self.db.execute("DELETE FROM connections WHERE created < ?",
+                                     (time.time() - self.stale,)).rowcount
+            if purged > 0:
+                _stats.count("connection cache eviction", purged)
+    
+    def key(self, from_location, to_location, arrival_time=None, limit=1, fields=None,
+            departure_time=None):
+        """Build the cache key for a query, rounding its time down to the bucket"""
+        when = arrival_time or departure_time
+        when = datetime.fromisoformat(when) if when else datetime.now()
+        minutes = when.hour * 60 + when.minute
+        bucket = minutes - minutes % self.bucket_minutes
+        return "|".join([f"v{CONNECTION_CACHE_VERSION}",
+                         normalize_query(location_param(from_location)),
+                         normalize_query(location_param(to_location)),
+                         f"{when.date()}T{bucket // 60:02d}:{bucket % 60:02d}",
+                         "arrival" if arrival_time else "departure",
+                         str(limit),
+                         fields or "full"])
+    
+    def get(self, key):
+        """Return (result, is_fresh) for a key, or (None, False) on a miss"""
+        now = time.time()
+        try:
+            with self.lock, self.db:
+                row = self.db.execute("SELECT data, created FROM connections WHERE key = ?",
+                                      (key,)).fetchone()
+                if row is not None and now - row[1] > self.stale:
+                    self.db.execute("DELETE FROM connections WHERE key = ?", (key,))
+                    _stats.count("connection cache eviction")
+                    row = None
+                if row is None:
+                    return None, False
+                
+                self.db.execute("UPDATE connections SET last_used = ? WHERE key = ?", (now, key))
+                is_fresh = now - row[1] <= self.fresh
+            return decode_result(json.loads(row[0])), is_fresh
+        except sqlite3.Error:
+            return None, False
+    
+    def put(self, key, result):
+        """Store a result, evicting the least recently used entries if full"""
+        now = time.time()
+        try:
+            with self.lock, self.db:
+                self.db.execute("INSERT OR REPLACE INTO connections VALUES (?, ?, ?, ?)",
+                                (key, json.dumps(encode_result(result)), now, now))
+                count = self.db.execute("SELECT COUNT(*) FROM connections").fetchone()[0]
+                if count > self.max_entries:
+                    self.db.execute("""DELETE FROM connections WHERE key IN (
+                                           SELECT key FROM connections
+                                           ORDER BY last_used LIMIT ?)""",
+                                    (count - self.max_entries,))
+                    _stats.count("connection cache eviction", count - self.max_entries)
+        except sqlite3.Error:
+            pass
+    
+    def refresh(self, key, fetch):
+        """Re-run fetch() in the background and store its result under key"""
+        with self.lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+        _stats.count("connection cache refresh")
+        
+        def run():
+            try:
+                result = fetch()
+                if result["status"] == "OK":
+                    self.put(key, result)
+            finally:
+                with self.lock:
+                    self.refreshing.discard(key)
+        
+        self.refresher.submit(run)
+    
+    def close(self):
+        """Wait for pending background refreshes, then close the database"""
+        self.refresher.shutdown(wait=True)
+        self.db.close()
+
+_location_cache = None
+_connection_cache = None
+_router = None
+_station_index = None
+_station_index_lock = threading.Lock()
+_server = None
+
+# Lowest similarity (0-1) at which the station index answers a query itself
+STATION_INDEX_MIN_SCORE = 0.75
+# Below this similarity, every word of the query must also match a word of
+# the station's name, so "Lausanne Flon" isn't taken for Lausanne
+STATION_INDEX_NEAR_EXACT = 0.9
+STATION_INDEX_WORD_SCORE = 0.6
+
+def fold_name(text):
+    """Casefold a name and strip accents and punctuation, so 'Bergère' matches 'bergere'"""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    letters = "".join(c if c.isalnum() else " " for c in decomposed if not unicodedata.combining(c))
+    return " ".join(letters.split())
+
+def trigrams(folded):
+    """Return the set of three-character substrings of a folded name, padded at the ends"""
+    padded = f"  {folded} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class StationIndex:
+    """Offline trigram index over station names for typo- and accent-tolerant lookups"""
+    def __init__(self, locations=()):
+        self.locations = []
+        self.names = []
+        self.sizes = []
+        # Trigram -> indexes of the stations whose name contains it
+        self.postings = {}
+        self.ids = set()
+        for location in locations:
+            self.add(location)
+    
+    @classmethod
+    def from_timetable(cls, timetable):
+        """Index the stations (stops without a parent station) of a Timetable"""
+        index = cls()
+        for stop in range(timetable.stop_count):
+            if timetable.stop_parent[stop] < 0:
+                stop_id = timetable.stop_id(stop)
+                index.add(Location(name=timetable.stop_name(stop),
+                                   id=stop_id[len("Parent"):] if stop_id.startswith("Parent") else stop_id,
+                                   x=timetable.stop_lat[stop],
+                                   y=timetable.stop_lon[stop]))
+        return index
+    
+    def __len__(self):
+        return len(self.locations)
+    
+    def add(self, location):
+        """Add a station, unless one with the same id is already indexed"""
+        if location.id in self.ids:
+            return
+        self.ids.add(location.id)
+        folded = fold_name(location.name)
+        grams = trigrams(folded)
+        i = len(self.locations)
+        self.locations.append(location)
+        self.names.append(folded)
+        self.sizes.append(len(grams))
+        for gram in grams:
+            self.postings.setdefault(gram, []).append(i)
+    
+    def search(self, query, limit=5):
+        """Return up to `limit` (score, Location) pairs, best first
+        
+        The score is the Dice similarity of the trigram sets, and 1 for names
+        equal to the query once folded.
+        """
+        folded = fold_name(query)
+        grams = trigrams(folded)
+        shared = {}
+        for gram in grams:
+            for i in self.postings.get(gram, ()):
+                shared[i] = shared.get(i, 0) + 1
+        
+        scored = []
+        for i, count in shared.items():
+            score = 1.0 if self.names[i] == folded else 2 * count / (len(grams) + self.sizes[i])
+            scored.append((score, -len(self.names[i]), i))
+        scored.sort(reverse=True)
+        return [(score, self.locations[i]) for score, _, i in scored[:limit]]
+    
+    def match(self, query, min_score=STATION_INDEX_MIN_SCORE):
+        """Return (score, Location) for the best-matching station if it is similar enough, else None
+        
+        Unless it is near exact, a match must also have a similar word in the
+        station's name for each word of the query.
+        """
+        matches = self.search(query, limit=1)
+        if not matches or matches[0][0] < min_score:
+            return None
+        score, location = matches[0]
+        if score < STATION_INDEX_NEAR_EXACT:
+            words = [trigrams(word) for word in fold_name(location.name).split()]
+            for word in fold_name(query).split():
+                grams = trigrams(word)
+                if not any(2 * len(grams & other) / (len(grams) + len(other)) >= STATION_INDEX_WORD_SCORE
+                           for other in words):
+                    return None
+        return score, location
+    
+    def lookup(self, query, min_score=STATION_INDEX_MIN_SCORE):
+        """Return the best-matching station if it is similar enough, else None"""
+        match = self.match(query, min_score)
+        return match[1] if match else None
+
+def set_location_cache(cache):
+    """Install the cache consulted by search_location (None disables caching)"""
+    global _location_cache
+    _location_cache = cache
+
+def set_connection_cache(cache):
+    """Install the cache consulted by get_connections (None disables caching)"""
+    global _connection_cache
+    _connection_cache = cache
+
+def set_station_index(index):
+    """Install the offline station index consulted by search_location (None disables it)
+    
+    `index` may also be a function returning the index (or None), called when
+    the index is first needed.
+    """
+    global _station_index
+    with _station_index_lock:
+        _station_index = index
+
+def get_station_index():
+    """Return the installed station index, building it first if it was installed as a function"""
+    global _station_index
+    with _station_index_lock:
+        if callable(_station_index):
+            with _stats.timed("station index build"):
+                _station_index = _station_index()
+        return _station_index
+
+def set_server(server):
+    """Send lookups to a `serve` process through a ServerClient instead (None disables it)"""
+    global _server
+    _server = server
+
+def set_router(router):
+    """Route get_connections through a local router instead of the API (None restores the API)"""
+    global _router
+    _router = router
+
+def parse_coordinates(query):
+    """Return a Location for a "latitude,longitude" query, or None for anything else"""
+    try:
+        lat, lon = map(float, query.split(","))
+    except ValueError:
+        return None
+    if -90 <= lat <= 90 and -180 <= lon <= 180:
+        return Location(name=query.strip(), x=lat, y=lon, type="address")
+    return None
+
+class SingleFlight:
+    """Let concurrent callers asking for the same key share one call and its result"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.counters = {"calls": 0, "shared": 0}
+    
+    def do(self, key, fn):
+        """Return fn(), or wait for the result of the same key's call already in flight"""
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = self.calls[key] = Future()
+                self.counters["calls"] += 1
+            else:
+                self.counters["shared"] += 1
+        if not leader:
+            return future.result()
+        
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+# Identical lookups running at the same time (e.g. a destination shared by
+# many matrix rows) are made only once
+_location_flights = SingleFlight()
+_connection_flights = SingleFlight()
+
 def search_location(query):
-    """Search for a location using Swiss transport API"""
-    url = "http://transport.opendata.ch/v1/locations"
+    """Search for a location using Swiss transport API
+    
+    "latitude,longitude" queries need no lookup. Queries are first looked
+    up in the cache, then in the offline station index; only misses reach
+    the API. Concurrent searches for the same query share one lookup.
+    """
+    with _stats.timed("search_location"):
+        return _location_flights.do(normalize_query(query), lambda: lookup_location(query))
+
+def lookup_location(query):
+    """search_location() without sharing concurrent lookups"""
+    location = parse_coordinates(query)
+    if location:
+        return location
+    
+    if _server is not None:
+        return _server.search_location(query)
+    
+    cache = _location_cache
+    if cache is not None:
+        cached = cache.get(query)
+        if cached:
+            _stats.count("location cache hit")
+            return Location.from_dict(cached)
+        _stats.count("location cache miss")
+    
+    index = get_station_index()
+    if index is not None:
+        match = index.match(query)
+        if match:
+            score, location = match
+            _stats.count("location index hit")
+            # Exact names are cached too, so the next run needs no index; a
+            # fuzzy guess is left out of the cache rather than kept for days
+            if cache is not None and score == 1.0:
+                cache.put(query, location.to_dict())
+            return location
+    
     params = {"query": query, "type": "all"}
     
     try:
-        response = requests.get(url, params=params)
-        data = response.json()
+        data = get_client().get("locations", params)
         
         if data["stations"]:
             # Return the first (best) match
-            station = data["stations"][0]
-            return {
-                "id": station["id"],
-                "name": station["name"],
-                "coordinate": station["coordinate"]
-            }
+            location = Location.from_api(data["stations"][0])
+            if cache is not None:
+                cache.put(query, location.to_dict())
+            return location
     except Exception as e:
-        print(f"Error searching for {query}: {e}")
+        print(f"Error searching for {query}: {e}", file=sys.stderr)
     
     return None
 
-def get_connections(from_location, to_location, arrival_time=None):
-    """Get public transport connections between two locations"""
-    url = "http://transport.opendata.ch/v1/connections"
+def get_connections(from_location, to_location, arrival_time=None, limit=1, fields=None,
+                    departure_time=None):
+    """Get public transport connections between two locations (Location objects or names)
+    
+    Returns {"status": "OK", "connections": [Connection, ...]} with up to
+    `limit` connections, best first, or {"status": "ERROR", "message": ...}.
+    `fields` names an entry of CONNECTION_FIELDS to download only what that
+    output mode needs. Without an arrival_time, connections leave at
+    departure_time (default: now). Concurrent identical requests share one
+    lookup, and the result.
+    """
+    key = (from_location, to_location, arrival_time, limit, fields, departure_time)
+    with _stats.timed("get_connections"):
+        return _connection_flights.do(key, lambda: lookup_connections(
+            from_location, to_location, arrival_time, limit, fields, departure_time))
+
+def lookup_connections(from_location, to_location, arrival_time=None, limit=1, fields=None,
+                       departure_time=None):
+    """get_connections() without sharing concurrent lookups"""
+    if _server is not None:
+        return _server.get_connections(from_location, to_location, arrival_time, limit, fields,
+                                       departure_time)
+    if _router is not None:
+        with _stats.timed("local routing"):
+            return _router.get_connections(from_location, to_location, arrival_time, limit, fields,
+                                           departure_time)
+    
+    cache = _connection_cache
+    if cache is None:
+        return fetch_connections(from_location, to_location, arrival_time, limit, fields,
+                                 departure_time)
+    
+    key = cache.key(from_location, to_location, arrival_time, limit, fields, departure_time)
+    result, is_fresh = cache.get(key)
+    if result is not None and not is_fresh and not (arrival_time or departure_time):
+        # Leaving now, a stale answer may list departures that have already
+        # left, so it is fetched again before answering
+        result = None
+    _stats.count("connection cache miss" if result is None else
+                 "connection cache hit" if is_fresh else "connection cache stale hit")
+    if result is not None:
+        if not is_fresh:
+            cache.refresh(key, lambda: fetch_connections(from_location, to_location, arrival_time,
+                                                         limit, fields, departure_time))
+        return result
+    
+    result = fetch_connections(from_location, to_location, arrival_time, limit, fields,
+                               departure_time)
+    if result["status"] == "OK":
+        cache.put(key, result)
+    return result
+
+def format_duration(duration_mins):
+    """Format a number of minutes as e.g. '27min' or '1h 11min'"""
+    hours = duration_mins // 60
+    mins = duration_mins % 60
+    return f"{hours}h {mins}min" if hours > 0 else f"{mins}min"
+
+def parse_connection(conn):
+    """Build a Connection from an API connection, parsing each timestamp once
+    
+    The API's epoch timestamps are used where they were sent; the ISO 8601
+    departure is still parsed for the UTC offset the times are shown in.
+    """
+    departure, utc_offset = parse_timestamp(conn["from"]["departure"])
+    arrival = checkpoint_time(conn["to"], "arrival")
     
+    sections = []
+    # Sections are missing when they weren't among the requested fields
+    for section in conn.get("sections") or []:
+        if section.get("journey"):
+            journey = section["journey"]
+            leaves = checkpoint_time(section["departure"], "departure")
+            arrives = checkpoint_time(section["arrival"], "arrival")
+            sections.append(Section(
+                category=journey.get("category", "Transport"),
+                number=journey.get("number", ""),
+                name=journey.get("name", ""),
+                origin=section["departure"]["station"]["name"],
+                destination=section["arrival"]["station"]["name"],
+                departure=leaves,
+                arrival=arrives,
+                duration=arrives - leaves if leaves and arrives else 0,
+                platform=section["departure"].get("platform", "")
+            ))
+        elif section.get("walk"):
+            walk_duration = section["walk"].get("duration", 0)
+            if walk_duration:
+                sections.append(Section(
+                    category="Walk",
+                    duration=walk_duration,
+                    origin=section["departure"]["station"]["name"] if "departure" in section else "",
+                    destination=section["arrival"]["station"]["name"] if "arrival" in section else ""
+                ))
+    
+    return Connection(departure=departure,
+                      arrival=arrival,
+                      transfers=conn.get("transfers", 0),
+                      sections=tuple(sections),
+                      utc_offset=utc_offset)
+
+def connection_params(from_location, to_location, arrival_time=None, limit=1, fields=None,
+                      departure_time=None):
+    """Build the query parameters for the connections API"""
     params = {
-        "from": from_location,
-        "to": to_location,
-        "limit": 1  # Get next available connection
+        "from": location_param(from_location),
+        "to": location_param(to_location),
+        # The API returns at most API_MAX_LIMIT connections per page
+        "limit": min(limit, API_MAX_LIMIT)
     }
     
     # If arrival time specified, add it to params
     if arrival_time:
         params["isArrivalTime"] = 1
         params["time"] = arrival_time
+    elif departure_time:
+        params["time"] = departure_time
+    
+    if fields:
+        params["fields[]"] = CONNECTION_FIELDS[fields]
+    
+    return params
+
+def fetch_connections(from_location, to_location, arrival_time=None, limit=1, fields=None,
+                      departure_time=None):
+    """Fetch connections between two locations from the API, bypassing the cache"""
+    params = connection_params(from_location, to_location, arrival_time, limit, fields,
+                               departure_time)
     
     try:
-        response = requests.get(url, params=params)
-        data = response.json()
-        
-        if data["connections"]:
-            conn = data["connections"][0]
+        connections = []
+        seen = set()
+        for page in range(-(-limit // params["limit"])):
+            if page:
+                params["page"] = page
+            data = get_client().get("connections", params)
+            if not data["connections"]:
+                break
             
-            # Calculate duration
-            departure = datetime.fromisoformat(conn["from"]["departure"].replace("Z", "+00:00"))
-            arrival = datetime.fromisoformat(conn["to"]["arrival"].replace("Z", "+00:00"))
-            duration = arrival - departure
-            duration_mins = int(duration.total_seconds() / 60)
-            
-            # Format duration
-            hours = duration_mins // 60
-            mins = duration_mins % 60
-            duration_str = f"{hours}h {mins}min" if hours > 0 else f"{mins}min"
-            
-            # Get journey details
-            sections = []
-            for section in conn["sections"]:
-                if section["journey"]:
-                    journey = section["journey"]
-                    sections.append({
-                        "type": journey.get("category", "Transport"),
-                        "number": journey.get("number", ""),
-                        "name": journey.get("name", ""),
-                        "from": section["departure"]["station"]["name"],
-                        "to": section["arrival"]["station"]["name"],
-                        "departure": section["departure"]["departure"],
-                        "arrival": section["arrival"]["arrival"],
-                        "platform": section["departure"].get("platform", "")
-                    })
-                elif section.get("walk"):
-                    walk_duration = section["walk"].get("duration", 0) if section["walk"] else 0
-                    if walk_duration:
-                        walk_duration = walk_duration // 60
-                        sections.append({
-                            "type": "Walk",
-                            "duration": f"{walk_duration} min",
-                            "from": section["departure"]["station"]["name"] if "departure" in section else "",
-                            "to": section["arrival"]["station"]["name"] if "arrival" in section else ""
-                        })
-            
-            return {
-                "duration": duration_str,
-                "departure": conn["from"]["departure"],
-                "arrival": conn["to"]["arrival"],
-                "transfers": conn.get("transfers", 0),
-                "sections": sections,
-                "status": "OK"
-            }
+            with _stats.timed("parse connections"):
+                for conn in data["connections"]:
+                    # Neighbouring pages can overlap
+                    key = (conn["from"]["departure"], conn["to"]["arrival"])
+                    if key not in seen:
+                        seen.add(key)
+                        connections.append(parse_connection(conn))
+        
+        if connections:
+            return {"status": "OK", "connections": connections[:limit]}
         else:
             return {"status": "ERROR", "message": "No connections found"}
             
     except Exception as e:
         return {"status": "ERROR", "message": str(e)}
 
+def get_profile(from_location, to_location, start, end, fields=None):
+    """Get every connection leaving between two datetimes that isn't beaten by a later one
+    
+    A connection is dropped if another leaves no earlier and arrives no later.
+    The result is like get_connections()'s, with the connections sorted by
+    departure. The API is asked for as many connections per call as it allows,
+    paging forward in time until the window is covered.
+    """
+    if _server is not None:
+        return _server.get_profile(from_location, to_location, start, end, fields)
+    if _router is not None:
+        return _router.get_profile(from_location, to_location, start, end, fields)
+    
+    connections = {}
+    when = start
+    while when <= end:
+        result = get_connections(from_location, to_location, limit=API_MAX_LIMIT, fields=fields,
+                                 departure_time=when.strftime("%Y-%m-%dT%H:%M"))
+        if result["status"] != "OK":
+            if not connections:
+                return result
+            break
+        
+        departures = []
+        for conn in result["connections"]:
+            departures.append(conn.local_time(conn.departure))
+            if start <= departures[-1] <= end:
+                connections[conn.departure, conn.arrival] = conn
+        # Continue just after the last departure seen
+        following = max(departures) + timedelta(minutes=1)
+        if following <= when:
+            break
+        when = following
+    
+    # Walk back from the latest departure, keeping connections that arrive
+    # earlier than everything leaving after them
+    front = []
+    earliest_arrival = None
+    for departure, arrival in sorted(connections, reverse=True):
+        if earliest_arrival is None or arrival < earliest_arrival:
+            front.append(connections[departure, arrival])
+            earliest_arrival = arrival
+    
+    if not front:
+        return {"status": "ERROR", "message": "No connections found"}
+    front.reverse()
+    return {"status": "OK", "connections": front}
+
+def route_destination(from_location, dest_query, arrival_time=None, limit=1, fields=None,
+                      window=None):
+    """Resolve a destination and get the connections to it from the starting point
+    
+    With a (start, end) window, every worthwhile connection leaving in it is returned.
+    """
+    to_location = search_location(dest_query)
+    
+    if not to_location:
+        return None, None
+    
+    if window:
+        return to_location, get_profile(from_location, to_location, window[0], window[1], fields)
+    return to_location, get_connections(from_location, to_location, arrival_time, limit, fields)
+
+def print_route_details(connection):
+    """Print the sections and transfers of one connection"""
+    print("\n📋 Route details:")
+    for i, section in enumerate(connection.sections, 1):
+        if section.is_walk:
+            minutes = f"{section.duration // 60} min"
+            if section.origin and section.destination:
+                print(f"   {i}. 🚶 Walk: {minutes} from {section.origin} to {section.destination}")
+            else:
+                print(f"   {i}. 🚶 Walk: {minutes}")
+        else:
+            transport = section.transport
+            if section.name:
+                transport += f" ({section.name})"
+            platform = f" - Platform {section.platform}" if section.platform else ""
+            print(f"   {i}. 🚂 {transport}: {section.origin} → {section.destination}{platform}")
+            
+            # Show departure/arrival times for this segment
+            if section.departure is not None and section.arrival is not None:
+                print(f"      Depart: {connection.clock(section.departure)} → "
+                      f"Arrive: {connection.clock(section.arrival)}")
+    
+    # Show transfer information
+    if connection.transfers > 0:
+        print(f"\n🔄 Transfer details:")
+        for current, next_section in zip(connection.sections, connection.sections[1:]):
+            if not current.is_walk and not next_section.is_walk:
+                print(f"   • At {current.destination}: Change to {next_section.transport}")
+                if next_section.platform:
+                    print(f"     → Platform {next_section.platform}")
+
+def print_result(dest_name, dest_query, to_location, result, detailed=False):
+    """Print the travel time to one destination"""
+    print(f"📍 To {dest_name}:")
+    print("-" * 40)
+    
+    if not to_location:
+        print(f"Error: Could not find destination '{dest_query}'")
+        return
+    
+    if result["status"] == "OK":
+        connection = result["connections"][0]
+        print(f"⏱️  Duration: {connection.duration_text}")
+        print(f"🔄 Transfers: {connection.transfers}")
+        
+        if detailed and connection.sections:
+            print_route_details(connection)
+        
+        print(f"\n🕐 Next departure: {connection.clock(connection.departure)} → "
+              f"Arrival: {connection.clock(connection.arrival)}")
+        
+        if len(result["connections"]) > 1:
+            print_alternatives(result["connections"], detailed)
+    else:
+        print(f"❌ Error: {result['message']}")
+    
+    print()
+
+def parse_arrival_time(arrive, date=None):
+    """Turn HH:MM (and an optional YYYY-MM-DD date) into the datetime to arrive by
+    
+    Without a date, the next weekday on which that time is still ahead is used.
+    Raises ValueError for malformed input.
+    """
+    hour, minute = map(int, arrive.split(':'))
+    
+    # Get date (default to next weekday if not specified)
+    if date:
+        target_date = datetime.strptime(date, "%Y-%m-%d").date()
+    else:
+        # Find next weekday (Monday-Friday)
+        target_date = datetime.now().date()
+        while target_date.weekday() >= 5:  # Saturday = 5, Sunday = 6
+            target_date = target_date.replace(day=target_date.day + 1)
+        
+        # If the time has already passed today and it's a weekday, use tomorrow
+        now = datetime.now()
+        if (target_date == now.date() and 
+            now.hour * 60 + now.minute > hour * 60 + minute and 
+            now.weekday() < 5):
+            target_date = target_date.replace(day=target_date.day + 1)
+            # Skip weekend if needed
+            while target_date.weekday() >= 5:
+                target_date = target_date.replace(day=target_date.day + 1)
+    
+    return datetime(target_date.year, target_date.month, target_date.day, hour, minute)
+
+def add_lookup_arguments(parser, client=True, rate=DEFAULT_API_RATE):
+    """Add the options controlling API access and caching shared by all commands
+    
+    With client=False, the option to use a `serve` process is left out.
+    `rate` is the command's default for --rate.
+    """
+    if client:
+        parser.add_argument("--server", 
+                           metavar="URL",
+                           help="Send lookups to a running 'serve' process (e.g. http://127.0.0.1:8766)")
+    parser.add_argument("--jobs", "-j", 
+                       metavar="N",
+                       type=int,
+                       default=DEFAULT_JOBS,
+                       help=f"Number of lookups to run in parallel (default: {DEFAULT_JOBS}, 1 = one at a time)")
+    parser.add_argument("--api-url", 
+                       metavar="URL",
+                       default=API_BASE_URL,
+                       help=f"Base URL of the transport API (default: {API_BASE_URL})")
+    parser.add_argument("--rate", 
+                       metavar="N",
+                       type=float,
+                       default=rate,
+                       help=f"Maximum API requests per second (default: {rate})")
+    parser.add_argument("--connect-timeout", 
+                       metavar="SECONDS",
+                       type=float,
+                       default=CONNECT_TIMEOUT,
+                       help=f"Give up connecting to the API after this long (default: {CONNECT_TIMEOUT})")
+    parser.add_argument("--read-timeout", 
+                       metavar="SECONDS",
+                       type=float,
+                       default=READ_TIMEOUT,
+                       help=f"Give up waiting for an API response after this long (default: {READ_TIMEOUT})")
+    parser.add_argument("--retries", 
+                       metavar="N",
+                       type=int,
+                       default=NETWORK_RETRIES,
+                       help=f"Retry requests failing with a network error or timeout N times (default: {NETWORK_RETRIES})")
+    parser.add_argument("--hedge", 
+                       action="store_true", 
+                       help="Send a duplicate of API requests slower than the recent 95th percentile")
+    parser.add_argument("--stats", 
+                       action="store_true", 
+                       help="Print where the time went (per phase: count, p50/p95) when done")
+    parser.add_argument("--stats-json", 
+                       metavar="FILE",
+                       help="Also write the --stats figures to FILE as JSON")
+    parser.add_argument("--no-cache", 
+                       action="store_true", 
+                       help="Don't read or write the on-disk lookup cache")
+    parser.add_argument("--refresh-locations", 
+                       action="store_true", 
+                       help="Look up all locations with the API again and update the cache")
+    parser.add_argument("--time-bucket", 
+                       metavar="MINUTES",
+                       type=int,
+                       default=CONNECTION_CACHE_BUCKET,
+                       help=f"Reuse cached connections for queries within the same MINUTES-wide window (default: {CONNECTION_CACHE_BUCKET})")
+    parser.add_argument("--no-index", 
+                       action="store_true", 
+                       help="Resolve every location with the API instead of the offline station index")
+    parser.add_argument("--backend", 
+                       choices=["api", "local"],
+                       default="api",
+                       help="Find connections with the online API or the offline timetable (default: api)")
+    parser.add_argument("--timetable", 
+                       metavar="FILE",
+                       default=default_timetable_path(),
+                       help="Timetable store written by import-gtfs (default: %(default)s)")
+    parser.add_argument("--pareto", 
+                       action="store_true", 
+                       help="With --backend local: show the fastest journey for each number of transfers")
+    parser.add_argument("--workers", 
+                       metavar="N",
+                       type=int,
+                       default=1,
+                       help="Processes used to search departure times in parallel with --pareto (default: 1)")
+
+def setup_lookups(parser, args):
+    """Validate the shared options and install the API client and caches"""
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.rate <= 0:
+        parser.error("--rate must be positive")
+    if args.connect_timeout <= 0 or args.read_timeout <= 0:
+        parser.error("--connect-timeout and --read-timeout must be positive")
+    if args.retries < 0:
+        parser.error("--retries can't be negative")
+    if args.time_bucket < 1:
+        parser.error("--time-bucket must be at least 1")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    
+    global _stats_output
+    _stats_output = (args.stats, args.stats_json)
+    
+    # Start afresh, so commands can also run one after another in one process
+    set_server(None)
+    set_router(None)
+    set_station_index(None)
+    
+    # The server keeps its own client, caches and timetable warm
+    if getattr(args, "server", None):
+        set_server(ServerClient(args.server))
+        return
+    
+    # One pooled session for every API call, with a socket per worker
+    set_client(TransportClient(base_url=args.api_url, pool_size=args.jobs, rate_limit=args.rate,
+                               timeout=(args.connect_timeout, args.read_timeout),
+                               retries=args.retries, hedge=args.hedge))
+    
+    # Resolved locations and connections are cached on disk so warm runs
+    # skip the lookups
+    if not args.no_cache:
+        try:
+            set_location_cache(LocationCache(refresh=args.refresh_locations))
+            set_connection_cache(ConnectionCache(bucket_minutes=args.time_bucket))
+        except (OSError, sqlite3.Error) as e:
+            print(f"Warning: lookup cache disabled ({e})", file=sys.stderr)
+    
+    if args.backend == "local":
+        try:
+            set_router(LocalRouter(Timetable(args.timetable), pareto=args.pareto,
+                                   workers=args.workers))
+        except (OSError, ValueError) as e:
+            parser.error(f"Could not load the timetable ({e}). Create it with import-gtfs first")
+    
+    # Station names known offline are looked up without the API. The index
+    # is only built for the first name missing from the cache, so runs
+    # answered from the cache don't pay for it. --refresh-locations asks
+    # the API for everything again, so it goes without
+    if not args.no_index and not args.refresh_locations:
+        set_station_index(lambda: build_station_index(args.timetable))
+
+def build_station_index(timetable_path):
+    """Index the stations of the timetable, if imported, and those resolved before; None if there are none"""
+    index = StationIndex()
+    if _router is not None:
+        index = StationIndex.from_timetable(_router.tt)
+    elif os.path.exists(timetable_path):
+        try:
+            timetable = Timetable(timetable_path)
+            index = StationIndex.from_timetable(timetable)
+            timetable.close()
+        except (OSError, ValueError):
+            pass
+    if _location_cache is not None:
+        for station in _location_cache.stations():
+            index.add(Location.from_dict(station))
+    return index if len(index) else None
+
+# Whether to print the statistics, and where to save them, when the lookups are closed
+_stats_output = (False, None)
+
+def close_lookups():
+    """Let any background cache refreshes finish and close the caches, then report --stats"""
+    if _connection_cache is not None:
+        _connection_cache.close()
+        set_connection_cache(None)
+    if _location_cache is not None:
+        _location_cache.close()
+        set_location_cache(None)
+    
+    show, path = _stats_output
+    if show:
+        _stats.report()
+    if path:
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(_stats.summary(), f, indent=2)
+        except OSError as e:
+            print(f"Warning: could not write statistics to {path} ({e})", file=sys.stderr)
+
+def print_transfer_stats(from_location, to_location, arrival_time, limit, fields, measure=False):
+    """Print how much data the API calls transferred, and with `measure`, what field projection saved"""
+    counters = get_client().counters
+    print(f"🐞 API requests: {counters['requests']}, bytes received: {counters['bytes']}, "
+          f"throttled: {counters['throttled']}, retried: {counters['retries']}, "
+          f"hedged: {counters['hedged']} ({counters['hedge_wins']} won)")
+    shared = _location_flights.counters["shared"] + _connection_flights.counters["shared"]
+    if shared:
+        print(f"🐞 Lookups shared with an identical one in flight: {shared}")
+    
+    # Measuring sends two more requests, so only when asked, and only for runs
+    # that fetched connections from the API: the local router and the cache
+    # send nothing to compare
+    fetched = "api connections" in _stats.summary()["phases"]
+    if measure and fields and to_location and fetched and _router is None and _server is None:
+        # Measure the saving on one sample query, with and without projection
+        params = connection_params(from_location, to_location, arrival_time, limit, fields)
+        projected = len(get_client().request("connections", params).content)
+        del params["fields[]"]
+        full = len(get_client().request("connections", params).content)
+        if full:
+            saved = full - projected
+            print(f"🐞 Field projection ({fields}): {projected} instead of {full} bytes per "
+                  f"connection request ({saved} bytes, {saved / full:.0%} saved)")
+
+def print_alternatives(connections, detailed=False):
+    """Print a compact table of alternative connections, and their routes if detailed"""
+    print(f"\n🔀 Alternatives:")
+    print(f"   {'#':>2}  {'Depart':<6}  {'Arrive':<6}  {'Duration':<8}  Transfers")
+    for i, conn in enumerate(connections, 1):
+        print(f"   {i:>2}  {conn.clock(conn.departure):<6}  {conn.clock(conn.arrival):<6}  "
+              f"{conn.duration_text:<8}  {conn.transfers}")
+    
+    if detailed:
+        for i, conn in enumerate(connections[1:], 2):
+            if conn.sections:
+                print(f"\n🔀 Alternative {i}:", end="")
+                print_route_details(conn)
+
+def json_encoder():
+    """Return a function serializing a value to a JSON string, using orjson if installed"""
+    try:
+        import orjson
+    except ImportError:
+        return lambda value: json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return lambda value: orjson.dumps(value).decode()
+
+def connection_summary(conn):
+    """The duration, times and transfers of a connection, as matrix and CSV columns"""
+    return {
+        "duration": conn.duration_text,
+        "duration_minutes": conn.duration // 60,
+        "departure": conn.isoformat(conn.departure),
+        "arrival": conn.isoformat(conn.arrival),
+        "transfers": conn.transfers
+    }
+
+def connection_record(conn):
+    """A connection as JSON-ready values, with ISO 8601 times"""
+    record = connection_summary(conn)
+    record["sections"] = [{
+        "category": section.category,
+        "number": section.number,
+        "name": section.name,
+        "origin": section.origin,
+        "destination": section.destination,
+        "departure": conn.isoformat(section.departure) if section.departure is not None else None,
+        "arrival": conn.isoformat(section.arrival) if section.arrival is not None else None,
+        "duration_minutes": section.duration // 60,
+        "platform": section.platform
+    } for section in conn.sections]
+    return record
+
+class ResultWriter:
+    """Write each destination's result as JSON, NDJSON or CSV, flushing as soon as it is written
+    
+    JSON is one object with the origin and a list of destinations, streamed
+    element by element; NDJSON is one self-contained object per destination;
+    CSV has the matrix command's columns.
+    """
+    def __init__(self, out, fmt, address, origin):
+        self.out = out
+        self.fmt = fmt
+        self.address = address
+        self.origin = origin
+        self.dumps = json_encoder()
+        self.written = 0
+        if fmt == "csv":
+            self.writer = csv.DictWriter(out, fieldnames=MATRIX_FIELDS)
+            self.writer.writeheader()
+        elif fmt == "json":
+            out.write(f'{{"origin": {self.dumps(origin.to_dict())}, "destinations": [')
+    
+    def write(self, dest_name, dest_query, to_location, result):
+        if self.fmt == "csv":
+            row = dict.fromkeys(MATRIX_FIELDS, "")
+            row.update(origin=self.address, destination=dest_name, origin_name=self.origin.name)
+            if to_location is None:
+                row.update(status="NOT_FOUND", message=f"Could not find destination '{dest_query}'")
+            elif result["status"] != "OK":
+                row.update(destination_name=to_location.name, status=result["status"],
+                           message=result["message"])
+            else:
+                row.update(destination_name=to_location.name, status="OK")
+                row.update(connection_summary(result["connections"][0]))
+            self.writer.writerow(row)
+        else:
+            record = {
+                "destination": dest_name,
+                "query": dest_query,
+                "origin": self.origin.to_dict(),
+                "location": to_location.to_dict() if to_location else None
+            }
+            if to_location is None:
+                record.update(status="NOT_FOUND", message=f"Could not find destination '{dest_query}'")
+            elif result["status"] != "OK":
+                record.update(status=result["status"], message=result["message"])
+            else:
+                record.update(status="OK",
+                              connections=[connection_record(conn) for conn in result["connections"]])
+            line = self.dumps(record)
+            if self.fmt == "json":
+                line = ("," if self.written else "") + "\n  " + line
+            else:
+                line += "\n"
+            self.out.write(line)
+        self.written += 1
+        self.out.flush()
+    
+    def close(self):
+        if self.fmt == "json":
+            self.out.write("\n]}\n")
+            self.out.flush()
+
 class ColoredHelpFormatter(argparse.RawDescriptionHelpFormatter):
     """Custom help formatter with colors"""
     def _format_action(self, action):
@@ -141,9 +1708,16 @@ class ColoredHelpFormatter(argparse.RawDescriptionHelpFormatter):
         
         return parts
 
-def main():
-    # Create custom epilog with colors
-    epilog = f"""
+class HelpParser(argparse.ArgumentParser):
+    """ArgumentParser whose epilog may be a function, only called when help is shown"""
+    def format_help(self):
+        if callable(self.epilog):
+            self.epilog = self.epilog()
+        return super().format_help()
+
+def main_epilog():
+    """Examples and notes shown after the options by -h"""
+    return f"""
 {Colors.BOLD}{Colors.CYAN}EXAMPLES:{Colors.ENDC}
   
   {Colors.YELLOW}Basic usage (departure now):{Colors.ENDC}
@@ -161,6 +1735,12 @@ def main():
     {Colors.BLUE}%(prog)s "Nyon" -a 08:30 --detailed{Colors.ENDC}
     {Colors.BLUE}%(prog)s "Nyon" -a 08:30 -d{Colors.ENDC}
     
+  {Colors.YELLOW}Next 4 connections to each destination:{Colors.ENDC}
+    {Colors.BLUE}%(prog)s "Nyon" --alternatives 4{Colors.ENDC}
+    
+  {Colors.YELLOW}When to leave: every worthwhile departure between 07:00 and 09:00:{Colors.ENDC}
+    {Colors.BLUE}%(prog)s "Nyon" --window 07:00-09:00{Colors.ENDC}
+    
   {Colors.YELLOW}Add custom destinations:{Colors.ENDC}
     {Colors.BLUE}%(prog)s "Nyon" --to "Geneva Airport"{Colors.ENDC}
     {Colors.BLUE}%(prog)s "Nyon" -t "EPFL" -t "Zurich HB"{Colors.ENDC}
@@ -168,6 +1748,29 @@ def main():
   {Colors.YELLOW}Only custom destinations (skip defaults):{Colors.ENDC}
     {Colors.BLUE}%(prog)s "Nyon" -t "Bern" -t "Basel SBB" --only{Colors.ENDC}
     
+  {Colors.YELLOW}Many destinations, looked up 16 at a time:{Colors.ENDC}
+    {Colors.BLUE}%(prog)s "Nyon" -t "Bern" -t "Basel SBB" -t "Zurich HB" --jobs 16{Colors.ENDC}
+    
+  {Colors.YELLOW}Travel time matrix from CSV/NDJSON files (see: %(prog)s matrix -h):{Colors.ENDC}
+    {Colors.BLUE}%(prog)s matrix --origins homes.csv --destinations offices.csv -a 08:30 --output times.csv{Colors.ENDC}
+    
+  {Colors.YELLOW}Import a GTFS timetable for offline use (see: %(prog)s import-gtfs -h):{Colors.ENDC}
+    {Colors.BLUE}%(prog)s import-gtfs gtfs_fp2025.zip{Colors.ENDC}
+    {Colors.BLUE}%(prog)s "Nyon" -a 08:30 --backend local{Colors.ENDC}
+    
+  {Colors.YELLOW}Areas reachable within 30/45/60 minutes as GeoJSON (see: %(prog)s isochrone -h):{Colors.ENDC}
+    {Colors.BLUE}%(prog)s isochrone "Nyon" --depart 08:00 --backend local --output nyon.geojson{Colors.ENDC}
+    
+  {Colors.YELLOW}Live departures of the IR 90 towards Brig (see: %(prog)s board -h):{Colors.ENDC}
+    {Colors.BLUE}%(prog)s board "Nyon" --line IR90 --to Brig{Colors.ENDC}
+    
+  {Colors.YELLOW}Machine-readable output, one JSON object per destination as it completes:{Colors.ENDC}
+    {Colors.BLUE}%(prog)s "Nyon" -t "Bern" --format ndjson{Colors.ENDC}
+    
+  {Colors.YELLOW}Keep caches warm in a server and query it (see: %(prog)s serve -h):{Colors.ENDC}
+    {Colors.BLUE}%(prog)s serve &{Colors.ENDC}
+    {Colors.BLUE}%(prog)s "Nyon" -a 08:30 --server http://127.0.0.1:8766{Colors.ENDC}
+    
   {Colors.YELLOW}Complete example:{Colors.ENDC}
     {Colors.BLUE}%(prog)s "Place de la Gare 3, Renens" -a 09:00 -d -t "CERN" --date 2025-06-30{Colors.ENDC}
     
@@ -181,12 +1784,20 @@ def main():
   {Colors.GREEN}•{Colors.ENDC} The script uses the free Swiss public transport API
   {Colors.GREEN}•{Colors.ENDC} No API key required!
         """
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
     
-    parser = argparse.ArgumentParser(
+    # Subcommands are dispatched by name; anything else is a starting address
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+    
+    parser = HelpParser(
         description=f"{Colors.BOLD}{Colors.HEADER}🚉 Swiss Public Transport Travel Time Calculator{Colors.ENDC}\n"
                     f"{Colors.CYAN}Calculate travel times to default or custom destinations{Colors.ENDC}",
         formatter_class=ColoredHelpFormatter,
-        epilog=epilog)
+        epilog=main_epilog)
     
     parser.add_argument("address", 
                        help="Starting address or location (e.g., 'Nyon', 'Rue du Lac 25, Morges')")
@@ -206,8 +1817,37 @@ def main():
     parser.add_argument("--only", "-o", 
                        action="store_true", 
                        help="Only show custom destinations, skip the defaults")
+    parser.add_argument("--window", "-w", 
+                       metavar="HH:MM-HH:MM",
+                       help="List every worthwhile connection leaving in this time window")
+    parser.add_argument("--alternatives", "-n", 
+                       metavar="N",
+                       type=int,
+                       default=1,
+                       help="Also list the next N connections to each destination")
+    parser.add_argument("--full-fields", 
+                       action="store_true", 
+                       help="Download complete connection objects instead of only the fields shown")
+    parser.add_argument("--format", "-f", 
+                       choices=["text", "json", "ndjson", "csv"],
+                       default="text",
+                       help="Output format: text for people, or JSON, NDJSON or CSV for programs "
+                            "(default: %(default)s)")
+    parser.add_argument("--debug", 
+                       action="store_true", 
+                       help="Print API request counts and bytes received")
+    parser.add_argument("--measure-projection", 
+                       action="store_true", 
+                       help="With --debug, send one connection request again with and without field "
+                            "projection to show the bytes saved")
+    add_lookup_arguments(parser)
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    setup_lookups(parser, args)
+    if args.alternatives < 1:
+        parser.error("--alternatives must be at least 1")
+    if args.measure_projection and not args.debug:
+        parser.error("--measure-projection needs --debug")
     
     # Prepare destinations
     destinations = {}
@@ -221,117 +1861,2250 @@ def main():
     
     # Handle arrival time
     arrival_datetime = None
-    if args.arrive:
+    window = None
+    if args.arrive and args.window:
+        parser.error("--arrive and --window can't be combined")
+    if args.window:
+        try:
+            start, end = args.window.split("-")
+            window_start = parse_arrival_time(start, args.date)
+            window_end = datetime.combine(window_start.date(), parse_arrival_time(end, args.date).time())
+            if window_end < window_start:
+                raise ValueError
+            window = (window_start, window_end)
+        except ValueError:
+            print("Error: Invalid time window. Use HH:MM-HH:MM (e.g., 07:00-09:00)",
+                  file=sys.stdout if args.format == "text" else sys.stderr)
+            sys.exit(1)
+        when = (f"🕐 Departing: between {window_start.strftime('%H:%M')} and {window_end.strftime('%H:%M')} "
+                f"on {window_start.strftime('%A, %Y-%m-%d')}")
+    elif args.arrive:
         # Parse time
         try:
-            hour, minute = map(int, args.arrive.split(':'))
-            
-            # Get date (default to next weekday if not specified)
-            if args.date:
-                target_date = datetime.strptime(args.date, "%Y-%m-%d").date()
-            else:
-                # Find next weekday (Monday-Friday)
-                target_date = datetime.now().date()
-                while target_date.weekday() >= 5:  # Saturday = 5, Sunday = 6
-                    target_date = target_date.replace(day=target_date.day + 1)
-                
-                # If the time has already passed today and it's a weekday, use tomorrow
-                now = datetime.now()
-                if (target_date == now.date() and 
-                    now.hour * 60 + now.minute > hour * 60 + minute and 
-                    now.weekday() < 5):
-                    target_date = target_date.replace(day=target_date.day + 1)
-                    # Skip weekend if needed
-                    while target_date.weekday() >= 5:
-                        target_date = target_date.replace(day=target_date.day + 1)
-            
-            arrival_datetime = f"{target_date}T{hour:02d}:{minute:02d}"
-            print(f"\n🚉 Swiss Public Transport Travel Times")
-            print(f"From: {args.address}")
-            print(f"📅 Arriving at destination by: {hour:02d}:{minute:02d} on {target_date.strftime('%A, %Y-%m-%d')}")
+            target = parse_arrival_time(args.arrive, args.date)
+            arrival_datetime = target.strftime("%Y-%m-%dT%H:%M")
+            when = f"📅 Arriving at destination by: {target.strftime('%H:%M')} on {target.strftime('%A, %Y-%m-%d')}"
         except ValueError:
-            print("Error: Invalid time format. Use HH:MM (e.g., 08:30)")
+            print("Error: Invalid time format. Use HH:MM (e.g., 08:30)",
+                  file=sys.stdout if args.format == "text" else sys.stderr)
             sys.exit(1)
     else:
+        when = f"🕐 Departing: Now"
+    
+    # Machine-readable formats write nothing to standard output but the results
+    text = args.format == "text"
+    if text:
         print(f"\n🚉 Swiss Public Transport Travel Times")
         print(f"From: {args.address}")
-        print(f"🕐 Departing: Now")
-    
-    print("=" * 60)
+        print(when)
+        print("=" * 60)
     
     # Search for the starting location
     from_location = search_location(args.address)
     
     if not from_location:
-        print(f"Error: Could not find location '{args.address}'")
-        print("Try being more specific or use a known station name")
+        out = sys.stdout if text else sys.stderr
+        print(f"Error: Could not find location '{args.address}'", file=out)
+        print("Try being more specific or use a known station name", file=out)
         sys.exit(1)
     
-    print(f"Starting point identified as: {from_location['name']}\n")
+    if text:
+        print(f"Starting point identified as: {from_location.name}\n")
+    
+    # Only download the connection fields this output needs
+    fields = None if args.full_fields else ("detailed" if args.detailed else "summary")
     
-    # Calculate times to each destination
-    for dest_name, dest_query in destinations.items():
-        print(f"📍 To {dest_name}:")
-        print("-" * 40)
+    # Calculate times to each destination. Lookups run in parallel, but text
+    # results are printed in the original destination order, while the other
+    # formats write each destination as soon as it is done.
+    jobs = max(1, min(args.jobs, len(destinations)))
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(route_destination, from_location, dest_query, arrival_datetime,
+                                   args.alternatives, fields, window)
+                   for dest_query in destinations.values()]
+        labels = dict(zip(futures, destinations.items()))
         
-        to_location = search_location(dest_query)
+        routed = []
+        writer = None if text else ResultWriter(sys.stdout, args.format, args.address, from_location)
+        for future in futures if text else as_completed(futures):
+            dest_name, dest_query = labels[future]
+            to_location, result = future.result()
+            with _stats.timed("render"):
+                if text:
+                    print_result(dest_name, dest_query, to_location, result, args.detailed)
+                else:
+                    writer.write(dest_name, dest_query, to_location, result)
+            if to_location:
+                routed.append(to_location)
+        if writer is not None:
+            writer.close()
+    
+    close_lookups()
+    
+    # API traffic happens in the server when there is one
+    if args.debug and not args.server:
+        with contextlib.redirect_stdout(sys.stdout if text else sys.stderr):
+            print_transfer_stats(from_location, routed[0] if routed else None, arrival_datetime,
+                                 args.alternatives, fields, args.measure_projection)
+    
+    if not text:
+        return
+    print("=" * 60)
+    print(f"🕐 Calculated at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"\n💡 Use {Colors.GREEN}-h{Colors.ENDC} or {Colors.GREEN}--help{Colors.ENDC} to see all options and examples")
+
+# Columns written by the matrix command, and by --format csv
+MATRIX_FIELDS = ["origin", "destination", "origin_name", "destination_name", "status",
+                 "duration", "duration_minutes", "departure", "arrival", "transfers", "message"]
+
+def read_places(path):
+    """Yield (label, query) pairs from a CSV or NDJSON file of locations
+    
+    CSV files need an 'address' column (or use their first column) and may have
+    a 'name' column. NDJSON lines are objects with the same keys, or plain strings.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".ndjson", ".jsonl")):
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if isinstance(record, str):
+                    yield record, record
+                else:
+                    query = record.get("address") or record.get("query")
+                    yield record.get("name") or query, query
+        else:
+            reader = csv.DictReader(f)
+            column = "address" if "address" in reader.fieldnames else reader.fieldnames[0]
+            for row in reader:
+                query = (row[column] or "").strip()
+                if query:
+                    yield (row.get("name") or query).strip(), query
+
+class MatrixWriter:
+    """Write matrix rows as CSV or NDJSON, flushing each row as it is written"""
+    def __init__(self, out, fmt):
+        self.out = out
+        self.fmt = fmt
+        self.dumps = json_encoder()
+        if fmt == "csv":
+            self.writer = csv.DictWriter(out, fieldnames=MATRIX_FIELDS)
+            self.writer.writeheader()
+    
+    def write(self, row):
+        if self.fmt == "csv":
+            self.writer.writerow(row)
+        else:
+            self.out.write(self.dumps(row) + "\n")
+        self.out.flush()
+
+def matrix_row(origin, destination, from_location, to_location, arrival_time):
+    """Compute one origin/destination pair of the matrix"""
+    row = dict.fromkeys(MATRIX_FIELDS, "")
+    row.update(origin=origin[0], destination=destination[0])
+    
+    if from_location is None or to_location is None:
+        missing = origin[1] if from_location is None else destination[1]
+        row.update(status="NOT_FOUND", message=f"Could not find location '{missing}'")
+        return row
+    
+    row.update(origin_name=from_location.name, destination_name=to_location.name)
+    result = get_connections(from_location, to_location, arrival_time, fields="summary")
+    if result["status"] != "OK":
+        row.update(status=result["status"], message=result["message"])
+        return row
+    
+    row.update(status="OK")
+    row.update(connection_summary(result["connections"][0]))
+    return row
+
+def matrix_main(argv):
+    """Compute travel times for every origin × destination pair"""
+    parser = argparse.ArgumentParser(
+        prog=f"{os.path.basename(sys.argv[0])} matrix",
+        description=f"{Colors.BOLD}{Colors.HEADER}🚉 Travel time matrix{Colors.ENDC}\n"
+                    f"{Colors.CYAN}Travel times from every origin to every destination, read from CSV or NDJSON files{Colors.ENDC}",
+        formatter_class=ColoredHelpFormatter)
+    parser.add_argument("--origins", 
+                       metavar="FILE",
+                       required=True,
+                       help="CSV or NDJSON file of starting addresses")
+    parser.add_argument("--destinations", 
+                       metavar="FILE",
+                       required=True,
+                       help="CSV or NDJSON file of destinations")
+    parser.add_argument("--output", 
+                       metavar="FILE",
+                       help="Write results to FILE instead of standard output")
+    parser.add_argument("--format", 
+                       choices=["csv", "ndjson"],
+                       help="Output format (default: from the --output extension, else csv)")
+    parser.add_argument("--arrive", "-a", 
+                       metavar="HH:MM",
+                       help="Calculate to arrive by this time (24-hour format, e.g., 08:30)")
+    parser.add_argument("--date", 
+                       metavar="YYYY-MM-DD",
+                       help="Specific date for arrival (default: next weekday)")
+    add_lookup_arguments(parser, rate=DEFAULT_MATRIX_RATE)
+    
+    args = parser.parse_args(argv)
+    
+    arrival_time = None
+    if args.arrive:
+        try:
+            arrival_time = parse_arrival_time(args.arrive, args.date).strftime("%Y-%m-%dT%H:%M")
+        except ValueError:
+            parser.error("Invalid time format. Use HH:MM (e.g., 08:30)")
+    
+    fmt = args.format
+    if fmt is None:
+        fmt = "ndjson" if args.output and args.output.endswith((".ndjson", ".jsonl")) else "csv"
+    
+    try:
+        origins = list(read_places(args.origins))
+        destinations = list(read_places(args.destinations))
+    except (OSError, ValueError, IndexError, TypeError) as e:
+        parser.error(f"Could not read input: {e}")
+    
+    setup_lookups(parser, args)
+    
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        # Resolve every distinct location exactly once
+        queries = list(dict.fromkeys(normalize_query(query) for _, query in origins + destinations))
+        resolved = dict(zip(queries, executor.map(search_location, queries)))
         
-        if not to_location:
-            print(f"Error: Could not find destination '{dest_query}'")
-            continue
+        out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+        try:
+            writer = MatrixWriter(out, fmt)
+            
+            # Keep only a bounded window of pairs in flight and write rows in
+            # input order as they complete, so memory use doesn't depend on
+            # the size of the matrix
+            pending = deque()
+            for origin in origins:
+                for destination in destinations:
+                    pending.append(executor.submit(matrix_row, origin, destination,
+                                                   resolved[normalize_query(origin[1])],
+                                                   resolved[normalize_query(destination[1])],
+                                                   arrival_time))
+                    if len(pending) >= args.jobs * 2:
+                        writer.write(pending.popleft().result())
+            while pending:
+                writer.write(pending.popleft().result())
+        finally:
+            if out is not sys.stdout:
+                out.close()
+    
+    close_lookups()
+
+# Offline timetable store. A GTFS feed is imported once into a single binary
+# file of typed arrays, which is memory-mapped on load instead of parsed.
+TIMETABLE_MAGIC = b"TTSTORE\x01"
+TIMETABLE_VERSION = 3
+
+# Minimum time to change between vehicles when the feed doesn't say otherwise
+DEFAULT_CHANGE_TIME = 120
+
+def default_timetable_path():
+    """Return where import-gtfs writes the timetable store by default"""
+    return os.path.join(default_cache_dir(), "timetable.bin")
+
+def parse_gtfs_time(value):
+    """Convert a GTFS HH:MM:SS time (hours may exceed 24) to seconds after midnight"""
+    hours, minutes, seconds = value.strip().split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+class GTFSFeed:
+    """Read the CSV tables of a GTFS feed from a .zip file or a directory"""
+    def __init__(self, path):
+        import zipfile
+        self.path = path
+        self.zip = None if os.path.isdir(path) else zipfile.ZipFile(path)
+    
+    def has(self, name):
+        if self.zip is None:
+            return os.path.exists(os.path.join(self.path, name))
+        return name in self.zip.namelist()
+    
+    def rows(self, name):
+        """Yield the rows of one table as dicts (nothing if the table is missing)"""
+        if not self.has(name):
+            return
+        if self.zip is None:
+            f = open(os.path.join(self.path, name), newline="", encoding="utf-8-sig")
+        else:
+            f = io.TextIOWrapper(self.zip.open(name), newline="", encoding="utf-8-sig")
+        with f:
+            yield from csv.DictReader(f)
+    
+    def close(self):
+        if self.zip is not None:
+            self.zip.close()
+
+class StringTable:
+    """Collect strings into one UTF-8 blob plus an array of offsets into it"""
+    def __init__(self):
+        self.blob = bytearray()
+        self.offsets = array("q", [0])
+    
+    def add(self, text):
+        self.blob += (text or "").encode()
+        self.offsets.append(len(self.blob))
+
+def write_timetable(path, sections, meta):
+    """Write named arrays (and bytearrays) to a timetable store file
+    
+    Layout: magic, header length, JSON header listing each section's offset
+    (from the end of the header), typecode and item count, then the raw
+    sections, each 8-byte aligned.
+    """
+    entries = {}
+    offset = 0
+    for name, data in sections.items():
+        typecode = data.typecode if isinstance(data, array) else "B"
+        entries[name] = [offset, typecode, len(data)]
+        offset += -(-len(data) * array(typecode).itemsize // 8) * 8
+    
+    header = {"version": TIMETABLE_VERSION, "byteorder": sys.byteorder, "meta": meta, "sections": entries}
+    header_bytes = json.dumps(header).encode()
+    padded_header = header_bytes + b" " * (-len(header_bytes) % 8)
+    
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(TIMETABLE_MAGIC)
+        f.write(len(padded_header).to_bytes(8, "little"))
+        f.write(padded_header)
+        for name, data in sections.items():
+            raw = data.tobytes() if isinstance(data, array) else bytes(data)
+            f.write(raw)
+            f.write(b"\0" * (-len(raw) % 8))
+    os.replace(tmp_path, path)
+
+def import_gtfs(feed_path, output_path, progress=print):
+    """Import a GTFS feed into a compact timetable store at output_path
+    
+    Stops, routes, trips and services become integer indices. Trips with the
+    same stop sequence are grouped into patterns (sorted by departure, and
+    split where one trip overtakes another), and
+    every pair of consecutive stops becomes a connection, sorted by departure
+    time. stop_times.txt must be grouped by trip_id, as feeds normally are.
+    """
+    feed = GTFSFeed(feed_path)
+    try:
+        # Stops
+        stop_index = {}
+        stop_ids, stop_names = StringTable(), StringTable()
+        stop_lat, stop_lon = array("d"), array("d")
+        parent_ids = []
+        for row in feed.rows("stops.txt"):
+            stop_index[row["stop_id"]] = len(stop_lat)
+            stop_ids.add(row["stop_id"])
+            stop_names.add(row.get("stop_name"))
+            stop_lat.append(float(row.get("stop_lat") or 0))
+            stop_lon.append(float(row.get("stop_lon") or 0))
+            parent_ids.append(row.get("parent_station") or "")
+        stop_parent = array("i", (stop_index.get(parent, -1) for parent in parent_ids))
+        progress(f"  {len(stop_lat)} stops")
+        
+        # Routes: the category (IR, S, B, ...) is in route_desc in Swiss feeds
+        route_index = {}
+        route_names, route_categories = StringTable(), StringTable()
+        for row in feed.rows("routes.txt"):
+            route_index[row["route_id"]] = len(route_index)
+            route_names.add(row.get("route_short_name") or row.get("route_long_name"))
+            route_categories.add(row.get("route_desc") or row.get("route_short_name"))
+        
+        # Services: weekly calendars plus added/removed dates
+        service_index = {}
+        service_start, service_end, service_days = array("i"), array("i"), array("i")
+        weekdays = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+        
+        def add_service(service_id, start=0, end=0, days=0):
+            service_index[service_id] = len(service_index)
+            service_start.append(start)
+            service_end.append(end)
+            service_days.append(days)
+        
+        for row in feed.rows("calendar.txt"):
+            days = sum(1 << i for i, day in enumerate(weekdays) if row.get(day) == "1")
+            add_service(row["service_id"], int(row["start_date"]), int(row["end_date"]), days)
+        
+        exceptions = []
+        for row in feed.rows("calendar_dates.txt"):
+            if row["service_id"] not in service_index:
+                add_service(row["service_id"])
+            exceptions.append((service_index[row["service_id"]], int(row["date"]),
+                               int(row["exception_type"])))
+        exceptions.sort()
+        
+        # Trips
+        trip_index = {}
+        trip_info = []
+        for row in feed.rows("trips.txt"):
+            trip_index[row["trip_id"]] = len(trip_info)
+            trip_info.append((route_index.get(row["route_id"], -1),
+                              service_index.get(row["service_id"], -1),
+                              row.get("trip_short_name") or ""))
+        
+        # Stop times, one trip at a time. Trips sharing a stop sequence share a pattern.
+        pattern_index = {}
+        raw_trips = []  # (pattern, first departure, trips.txt index, offset into raw times)
+        raw_arr, raw_dep = array("i"), array("i")
+        seen_trips = set()
+        
+        def flush_trip(trip_id, stop_times):
+            if trip_id in seen_trips:
+                raise ValueError("stop_times.txt must be grouped by trip_id")
+            seen_trips.add(trip_id)
+            if trip_id not in trip_index or len(stop_times) < 2:
+                return
+            stop_times.sort()
+            stops = tuple(st[1] for st in stop_times)
+            pattern = pattern_index.setdefault(stops, len(pattern_index))
+            raw_trips.append((pattern, stop_times[0][3], trip_index[trip_id], len(raw_arr)))
+            for _, _, arr, dep in stop_times:
+                raw_arr.append(arr)
+                raw_dep.append(dep)
+        
+        current_trip, stop_times = None, []
+        last_time = 0
+        for row in feed.rows("stop_times.txt"):
+            if row["trip_id"] != current_trip:
+                if current_trip is not None:
+                    flush_trip(current_trip, stop_times)
+                current_trip, stop_times = row["trip_id"], []
+            # Times may be left blank at stops that aren't timepoints
+            arr = row["arrival_time"] and parse_gtfs_time(row["arrival_time"])
+            dep = row["departure_time"] and parse_gtfs_time(row["departure_time"])
+            arr = arr if arr != "" else (dep if dep != "" else last_time)
+            dep = dep if dep != "" else arr
+            last_time = dep
+            stop_times.append((int(row["stop_sequence"]), stop_index[row["stop_id"]], arr, dep))
+        if current_trip is not None:
+            flush_trip(current_trip, stop_times)
+        del seen_trips
+        
+        # RAPTOR finds a pattern's next trip by binary search, so its trips
+        # mustn't overtake each other: a trip that would overtake an earlier
+        # one goes into another pattern with the same stops
+        raw_trips.sort()
+        sequences = [stops for stops, _ in sorted(pattern_index.items(), key=lambda item: item[1])]
+        patterns = []
+        groups = {}  # pattern -> [[new pattern, offset of its latest trip], ...]
+        for i, (pattern, first_departure, info, offset) in enumerate(raw_trips):
+            length = len(sequences[pattern])
+            for group in groups.setdefault(pattern, []):
+                last = group[1]
+                if all(raw_arr[offset + j] >= raw_arr[last + j] and raw_dep[offset + j] >= raw_dep[last + j]
+                       for j in range(length)):
+                    group[1] = offset
+                    break
+            else:
+                group = [len(patterns), offset]
+                groups[pattern].append(group)
+                patterns.append(sequences[pattern])
+            raw_trips[i] = (group[0], first_departure, info, offset)
+        del sequences, groups, pattern_index
+        progress(f"  {len(raw_trips)} trips in {len(patterns)} patterns")
+        
+        # Renumber trips so each pattern's trips are contiguous and sorted by departure
+        raw_trips.sort()
+        pattern_stop_offsets, pattern_stops = array("i", [0]), array("i")
+        for stops in patterns:
+            pattern_stops.extend(stops)
+            pattern_stop_offsets.append(len(pattern_stops))
+        
+        pattern_trip_offsets = array("i", [0] * (len(patterns) + 1))
+        trip_pattern, trip_route, trip_service = array("i"), array("i"), array("i")
+        trip_names = StringTable()
+        trip_st_offsets, st_arr, st_dep = array("i", [0]), array("i"), array("i")
+        for pattern, _, info, offset in raw_trips:
+            route, service, name = trip_info[info]
+            length = pattern_stop_offsets[pattern + 1] - pattern_stop_offsets[pattern]
+            pattern_trip_offsets[pattern + 1] += 1
+            trip_pattern.append(pattern)
+            trip_route.append(route)
+            trip_service.append(service)
+            trip_names.add(name)
+            st_arr.extend(raw_arr[offset:offset + length])
+            st_dep.extend(raw_dep[offset:offset + length])
+            trip_st_offsets.append(len(st_arr))
+        for p in range(len(patterns)):
+            pattern_trip_offsets[p + 1] += pattern_trip_offsets[p]
+        del raw_trips, raw_arr, raw_dep, trip_info
+        
+        # For each stop, the patterns serving it and the stop's position in each
+        stop_pattern_offsets = array("i", [0] * (len(stop_lat) + 1))
+        for stop in pattern_stops:
+            stop_pattern_offsets[stop + 1] += 1
+        for stop in range(len(stop_lat)):
+            stop_pattern_offsets[stop + 1] += stop_pattern_offsets[stop]
+        stop_patterns = array("i", [0] * len(pattern_stops))
+        stop_pattern_positions = array("i", [0] * len(pattern_stops))
+        slots = array("i", stop_pattern_offsets)
+        for p in range(len(patterns)):
+            first = pattern_stop_offsets[p]
+            for position in range(pattern_stop_offsets[p + 1] - first):
+                stop = pattern_stops[first + position]
+                stop_patterns[slots[stop]] = p
+                stop_pattern_positions[slots[stop]] = position
+                slots[stop] += 1
+        del slots
+        
+        # Connections between consecutive stops, stable-sorted by departure so
+        # zero-minute hops keep their order within a trip
+        conn_dep_stop, conn_arr_stop = array("i"), array("i")
+        conn_dep, conn_arr, conn_trip = array("i"), array("i"), array("i")
+        for trip in range(len(trip_pattern)):
+            first = pattern_stop_offsets[trip_pattern[trip]]
+            offset = trip_st_offsets[trip]
+            for i in range(trip_st_offsets[trip + 1] - offset - 1):
+                conn_dep_stop.append(pattern_stops[first + i])
+                conn_arr_stop.append(pattern_stops[first + i + 1])
+                conn_dep.append(st_dep[offset + i])
+                conn_arr.append(st_arr[offset + i + 1])
+                conn_trip.append(trip)
+        # A counting sort over the seconds of the service day: it is stable, and
+        # works in arrays, where a sorted() list of indices would take several
+        # times the memory of the connections themselves
+        first_at = array("i", [0]) * (max(conn_dep, default=0) + 2)
+        for dep in conn_dep:
+            first_at[dep + 1] += 1
+        for second in range(1, len(first_at)):
+            first_at[second] += first_at[second - 1]
+        position = array("i", [0]) * len(conn_dep)
+        for c, dep in enumerate(conn_dep):
+            position[c] = first_at[dep]
+            first_at[dep] += 1
+        del first_at
+        
+        def in_order(column):
+            ordered = array("i", [0]) * len(column)
+            for c, value in enumerate(column):
+                ordered[position[c]] = value
+            return ordered
+        
+        conn_dep_stop = in_order(conn_dep_stop)
+        conn_arr_stop = in_order(conn_arr_stop)
+        conn_dep = in_order(conn_dep)
+        conn_arr = in_order(conn_arr)
+        conn_trip = in_order(conn_trip)
+        del position
+        progress(f"  {len(conn_dep)} connections")
+        
+        # Footpaths: explicit transfers plus changes between platforms of one station
+        stop_change_time = array("i", [DEFAULT_CHANGE_TIME] * len(stop_lat))
+        footpaths = {}
+        for row in feed.rows("transfers.txt"):
+            # Transfers tied to particular trips or routes don't apply in general
+            if row.get("from_trip_id") or row.get("from_route_id") or row.get("transfer_type") == "3":
+                continue
+            from_stop = stop_index.get(row["from_stop_id"])
+            to_stop = stop_index.get(row["to_stop_id"])
+            if from_stop is None or to_stop is None:
+                continue
+            seconds = int(row.get("min_transfer_time") or DEFAULT_CHANGE_TIME)
+            if from_stop == to_stop:
+                stop_change_time[from_stop] = seconds
+            else:
+                footpaths[from_stop, to_stop] = seconds
         
-        result = get_connections(from_location["name"], to_location["name"], arrival_datetime)
+        children = {}
+        for stop, parent in enumerate(stop_parent):
+            if parent >= 0:
+                children.setdefault(parent, []).append(stop)
+        for platforms in children.values():
+            for a in platforms:
+                for b in platforms:
+                    if a != b:
+                        footpaths.setdefault((a, b), DEFAULT_CHANGE_TIME)
         
-        if result["status"] == "OK":
-            print(f"⏱️  Duration: {result['duration']}")
-            print(f"🔄 Transfers: {result['transfers']}")
+        footpath_offsets = array("i", [0] * (len(stop_lat) + 1))
+        footpath_to, footpath_time = array("i"), array("i")
+        for (from_stop, to_stop), seconds in sorted(footpaths.items()):
+            footpath_offsets[from_stop + 1] += 1
+            footpath_to.append(to_stop)
+            footpath_time.append(seconds)
+        for stop in range(len(stop_lat)):
+            footpath_offsets[stop + 1] += footpath_offsets[stop]
+        progress(f"  {len(footpath_to)} footpaths")
+        
+        service_ids = StringTable()
+        for service_id in service_index:
+            service_ids.add(service_id)
+        
+        sections = {
+            "stop_lat": stop_lat, "stop_lon": stop_lon, "stop_parent": stop_parent,
+            "stop_change_time": stop_change_time,
+            "stop_ids_blob": stop_ids.blob, "stop_ids_offsets": stop_ids.offsets,
+            "stop_names_blob": stop_names.blob, "stop_names_offsets": stop_names.offsets,
+            "route_names_blob": route_names.blob, "route_names_offsets": route_names.offsets,
+            "route_categories_blob": route_categories.blob,
+            "route_categories_offsets": route_categories.offsets,
+            "service_ids_blob": service_ids.blob, "service_ids_offsets": service_ids.offsets,
+            "service_start": service_start, "service_end": service_end, "service_days": service_days,
+            "exception_service": array("i", (e[0] for e in exceptions)),
+            "exception_date": array("i", (e[1] for e in exceptions)),
+            "exception_type": array("i", (e[2] for e in exceptions)),
+            "pattern_stop_offsets": pattern_stop_offsets, "pattern_stops": pattern_stops,
+            "pattern_trip_offsets": pattern_trip_offsets,
+            "stop_pattern_offsets": stop_pattern_offsets, "stop_patterns": stop_patterns,
+            "stop_pattern_positions": stop_pattern_positions,
+            "trip_pattern": trip_pattern, "trip_route": trip_route, "trip_service": trip_service,
+            "trip_names_blob": trip_names.blob, "trip_names_offsets": trip_names.offsets,
+            "trip_st_offsets": trip_st_offsets, "st_arr": st_arr, "st_dep": st_dep,
+            "conn_dep_stop": conn_dep_stop, "conn_arr_stop": conn_arr_stop,
+            "conn_dep": conn_dep, "conn_arr": conn_arr, "conn_trip": conn_trip,
+            "footpath_offsets": footpath_offsets, "footpath_to": footpath_to,
+            "footpath_time": footpath_time,
+        }
+        meta = {"feed": os.path.basename(os.path.normpath(feed_path)),
+                "imported": datetime.now().isoformat(timespec="seconds")}
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        write_timetable(output_path, sections, meta)
+    finally:
+        feed.close()
+
+class Timetable:
+    """Read-only timetable store, memory-mapped from a file written by import_gtfs()
+    
+    Every section of the store is exposed as a typed memoryview attribute of
+    the same name (stop_lat, conn_dep, ...), so nothing is parsed or copied on load.
+    """
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mm[:len(TIMETABLE_MAGIC)] != TIMETABLE_MAGIC:
+            raise ValueError(f"{path} is not a timetable store")
+        header_length = int.from_bytes(self.mm[8:16], "little")
+        header = json.loads(self.mm[16:16 + header_length])
+        if header["version"] != TIMETABLE_VERSION:
+            raise ValueError(f"{path} was written by an older version; run import-gtfs again")
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was written on a machine with a different byte order")
+        
+        self.path = path
+        self.meta = header["meta"]
+        view = memoryview(self.mm)
+        start = 16 + header_length
+        for name, (offset, typecode, count) in header["sections"].items():
+            size = array(typecode).itemsize
+            setattr(self, name, view[start + offset:start + offset + count * size].cast(typecode))
+        
+        self.stop_count = len(self.stop_lat)
+        self.trip_count = len(self.trip_pattern)
+        self.pattern_count = len(self.pattern_trip_offsets) - 1
+        self._stop_index = None
+        self._children = None
+        self._active = {}
+    
+    def string(self, table, i):
+        """Return entry i of a string table (e.g. 'stop_names')"""
+        offsets = getattr(self, table + "_offsets")
+        return bytes(getattr(self, table + "_blob")[offsets[i]:offsets[i + 1]]).decode()
+    
+    def stop_name(self, stop):
+        return self.string("stop_names", stop)
+    
+    def stop_id(self, stop):
+        return self.string("stop_ids", stop)
+    
+    def find_stop(self, stop_id):
+        """Return the index of a stop by GTFS id or Swiss station number, or None"""
+        if self._stop_index is None:
+            self._stop_index = {self.stop_id(i): i for i in range(self.stop_count)}
+        for candidate in (stop_id, f"Parent{stop_id}"):
+            if candidate in self._stop_index:
+                return self._stop_index[candidate]
+        return None
+    
+    def patterns_at(self, stop):
+        """Yield (pattern, position of the stop in it) for the patterns serving a stop"""
+        for i in range(self.stop_pattern_offsets[stop], self.stop_pattern_offsets[stop + 1]):
+            yield self.stop_patterns[i], self.stop_pattern_positions[i]
+    
+    def station_stops(self, stop):
+        """Return a stop together with all platforms of its station"""
+        if self._children is None:
+            children = {}
+            for child, parent in enumerate(self.stop_parent):
+                if parent >= 0:
+                    children.setdefault(parent, []).append(child)
+            self._children = children
+        station = self.stop_parent[stop] if self.stop_parent[stop] >= 0 else stop
+        return [station] + self._children.get(station, [])
+    
+    def active_trips(self, day):
+        """Return a bytearray flagging the trips that run on a date"""
+        key = day.toordinal()
+        if key not in self._active:
+            date = int(day.strftime("%Y%m%d"))
+            weekday = 1 << day.weekday()
+            services = bytearray(len(self.service_start))
+            for s in range(len(services)):
+                services[s] = (self.service_start[s] <= date <= self.service_end[s]
+                               and bool(self.service_days[s] & weekday))
+            for s, exception_date, kind in zip(self.exception_service, self.exception_date,
+                                               self.exception_type):
+                if exception_date == date:
+                    services[s] = kind == 1
+            self._active[key] = bytearray(services[s] if s >= 0 else 0 for s in self.trip_service)
+        return self._active[key]
+    
+    def close(self):
+        # Views into the map must be released before it can be closed
+        for name, value in list(vars(self).items()):
+            if isinstance(value, memoryview):
+                value.release()
+        self.mm.close()
+
+# Furthest ahead (or back) the local router searches, in seconds
+LOCAL_SEARCH_HORIZON = 24 * 3600
+
+# Most transfers a RAPTOR search considers
+MAX_TRANSFERS = 5
+
+# How far before an arrive-by time Pareto searches look for departures, in seconds
+PARETO_WINDOW = 2 * 3600
+
+INFINITY = float("inf")
+
+def platform_of(stop_id):
+    """Guess the platform from a Swiss GTFS stop id such as '8503000:0:34'"""
+    parts = stop_id.split(":")
+    return parts[-1] if len(parts) > 2 else ""
+
+def journey_times(legs, start=0):
+    """Return (departure, arrival) of a journey, counting walks at either end"""
+    rides = [leg for leg in legs if leg[0] == "ride"]
+    departure = rides[0][4] if rides else start
+    for leg in legs:
+        if leg[0] != "walk":
+            break
+        departure -= leg[3]
+    arrival = rides[-1][5] if rides else start
+    for leg in reversed(legs):
+        if leg[0] != "walk":
+            break
+        arrival += leg[3]
+    return departure, arrival
+
+# Walking between a place and the stops around it
+WALK_SPEED = 4.5 / 3.6
+# Streets wind: walking distance over straight-line distance
+WALK_DETOUR = 1.3
+# How many stations (with all their platforms), and how far away (in metres,
+# straight line), an address is connected to
+NEAREST_STOPS = 10
+MAX_ACCESS_WALK = 1500
+
+# Metres per degree of latitude (and of longitude at the equator)
+METRES_PER_DEGREE = 111320
+EARTH_RADIUS = 6371000
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres between two WGS84 coordinates"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(a))
+
+def walk_seconds(metres):
+    """Estimate the walking time for a straight-line distance"""
+    return int(metres * WALK_DETOUR / WALK_SPEED)
+
+class SpatialIndex:
+    """Points bucketed into a grid of roughly `cell`-metre squares for nearest-neighbour lookups"""
+    def __init__(self, points, cell=500):
+        points = list(points)
+        self.cell = cell
+        self.lat_step = cell / METRES_PER_DEGREE
+        # Sized for the point furthest from the equator, so no cell is narrower than `cell`
+        widest = max((abs(lat) for lat, _, _ in points), default=0)
+        self.lon_step = cell / (METRES_PER_DEGREE * max(math.cos(math.radians(widest)), 0.01))
+        self.cells = {}
+        for lat, lon, item in points:
+            self.cells.setdefault(self.cell_of(lat, lon), []).append((lat, lon, item))
+    
+    def __len__(self):
+        return sum(len(points) for points in self.cells.values())
+    
+    def cell_of(self, lat, lon):
+        return math.floor(lat / self.lat_step), math.floor(lon / self.lon_step)
+    
+    def nearest(self, lat, lon, k=NEAREST_STOPS, max_distance=MAX_ACCESS_WALK, key=None):
+        """Return up to k (metres, item) pairs within max_distance of a coordinate, nearest first
+        
+        Rings of cells are searched outwards until the k-th nearest point is
+        closer than anything in the next ring can be. With a `key` function,
+        only the nearest item of each key is kept.
+        """
+        row, col = self.cell_of(lat, lon)
+        found = []
+        for ring in range(int(max_distance // self.cell) + 2):
+            for r in range(row - ring, row + ring + 1):
+                # The whole top and bottom rows of the ring, just the ends of the others
+                step = 1 if abs(r - row) == ring else 2 * ring or 1
+                for c in range(col - ring, col + ring + 1, step):
+                    for point_lat, point_lon, item in self.cells.get((r, c), ()):
+                        distance = haversine(lat, lon, point_lat, point_lon)
+                        if distance <= max_distance:
+                            found.append((distance, item))
+            found.sort(key=lambda pair: pair[0])
+            if key is not None:
+                seen = set()
+                nearest = []
+                for distance, item in found:
+                    if key(item) not in seen:
+                        seen.add(key(item))
+                        nearest.append((distance, item))
+                found = nearest
+            # Points beyond this ring are at least `ring` cells away
+            if len(found) >= k and found[k - 1][0] <= ring * self.cell:
+                break
+        return found[:k]
+
+def stop_walks(stops):
+    """Return {stop: seconds walked to or from it} for such a dict or a plain list of stops"""
+    return stops if isinstance(stops, dict) else dict.fromkeys(stops, 0)
+
+def add_walks(legs, source, target, sources, targets):
+    """Add the walks from the origin to the first stop and from the last stop to the destination
+    
+    These walk legs have None instead of the origin or destination stop.
+    """
+    if sources.get(source):
+        legs.insert(0, ("walk", None, source, sources[source]))
+    if targets.get(target):
+        legs.append(("walk", target, None, targets[target]))
+    return legs
+
+def place_name(location):
+    return location.name if isinstance(location, Location) else location
+
+class LocalRouter:
+    """Connection Scan Algorithm router over an offline Timetable
+    
+    get_connections() takes the same arguments and returns results of the
+    same shape as the API-backed get_connections(). Only trips running on the
+    query's service day are considered.
+    """
+    def __init__(self, timetable, pareto=False, workers=1):
+        self.tt = timetable
+        # Return every Pareto-optimal journey (RAPTOR) instead of just the fastest (CSA)
+        self.pareto = pareto
+        self.workers = workers
+        self._incoming = None
+        self._names = None
+        self._grid = None
+    
+    def stops_for(self, location):
+        """Return {stop: seconds of walking} for the timetable stops matching a Location
+        
+        Stations (or station names) give all their platforms, with no walking.
+        A Location known only by its coordinates gives the nearest stops,
+        with the time it takes to walk there.
+        """
+        tt = self.tt
+        if isinstance(location, Location) and location.id:
+            stop = tt.find_stop(location.id)
+            if stop is not None:
+                return dict.fromkeys(tt.station_stops(stop), 0)
+        
+        if self._names is None:
+            # Built aside, so threads calling this at the same time never see it half-filled
+            names = {}
+            for stop in range(tt.stop_count):
+                names.setdefault(normalize_query(tt.stop_name(stop)), []).append(stop)
+            self._names = names
+        stops = set()
+        for stop in self._names.get(normalize_query(place_name(location)), []):
+            stops.update(tt.station_stops(stop))
+        if stops:
+            return dict.fromkeys(sorted(stops), 0)
+        
+        if isinstance(location, Location) and location.x is not None and location.y is not None:
+            return {stop: walk_seconds(metres) for metres, stop in self.nearest_stops(location.x, location.y)}
+        return {}
+    
+    def nearest_stops(self, lat, lon, k=NEAREST_STOPS, max_distance=MAX_ACCESS_WALK):
+        """Return (metres, stop) pairs for the stops of the k nearest stations, nearest first
+        
+        A station counts once however many platforms it has, so the platforms
+        of one big station can't crowd out every other station.
+        """
+        tt = self.tt
+        if self._grid is None:
+            self._grid = SpatialIndex((tt.stop_lat[stop], tt.stop_lon[stop], stop)
+                                      for stop in range(tt.stop_count))
+        stations = self._grid.nearest(lat, lon, k, max_distance,
+                                      key=lambda stop: tt.stop_parent[stop] if tt.stop_parent[stop] >= 0 else stop)
+        found = []
+        for _, nearest in stations:
+            for stop in tt.station_stops(nearest):
+                metres = haversine(lat, lon, tt.stop_lat[stop], tt.stop_lon[stop])
+                if metres <= max_distance:
+                    found.append((metres, stop))
+        found.sort(key=lambda pair: pair[0])
+        return found
+    
+    def footpaths(self, stop):
+        """Yield (neighbour, seconds) for the footpaths leaving a stop"""
+        tt = self.tt
+        for i in range(tt.footpath_offsets[stop], tt.footpath_offsets[stop + 1]):
+            yield tt.footpath_to[i], tt.footpath_time[i]
+    
+    def incoming_footpaths(self, stop):
+        """Yield (neighbour, seconds) for the footpaths arriving at a stop"""
+        if self._incoming is None:
+            incoming = {}
+            for from_stop in range(self.tt.stop_count):
+                for to_stop, seconds in self.footpaths(from_stop):
+                    incoming.setdefault(to_stop, []).append((from_stop, seconds))
+            self._incoming = incoming
+        return self._incoming.get(stop, ())
+    
+    def earliest_arrival(self, sources, targets, day, start):
+        """Scan forward from `start` seconds and return the legs of the earliest-arriving journey
+        
+        Each stop keeps two labels: when a vehicle (or footpath) gets there, and
+        when another vehicle can be boarded there, which includes the change time.
+        """
+        tt = self.tt
+        active = tt.active_trips(day)
+        conn_dep, conn_arr, conn_trip = tt.conn_dep, tt.conn_arr, tt.conn_trip
+        conn_dep_stop, conn_arr_stop = tt.conn_dep_stop, tt.conn_arr_stop
+        change_time = tt.stop_change_time
+        
+        sources, targets = stop_walks(sources), stop_walks(targets)
+        arrival, ready = {}, {}
+        arrival_label, ready_label = {}, {}
+        for stop, walk in sources.items():
+            arrival[stop] = ready[stop] = start + walk
+            arrival_label[stop] = ready_label[stop] = ("source",)
+        for stop, walk in sources.items():
+            for neighbour, seconds in self.footpaths(stop):
+                if start + walk + seconds < ready.get(neighbour, INFINITY):
+                    arrival[neighbour] = ready[neighbour] = start + walk + seconds
+                    arrival_label[neighbour] = ready_label[neighbour] = ("walk", stop, seconds)
+        
+        best = min((arrival.get(stop, INFINITY) + walk for stop, walk in targets.items()),
+                   default=INFINITY)
+        boarded = {}
+        end = start + LOCAL_SEARCH_HORIZON
+        for c in range(bisect.bisect_left(conn_dep, start), len(conn_dep)):
+            dep = conn_dep[c]
+            if dep >= best or dep > end:
+                break
+            trip = conn_trip[c]
+            if not active[trip]:
+                continue
+            if trip not in boarded:
+                if ready.get(conn_dep_stop[c], INFINITY) > dep:
+                    continue
+                boarded[trip] = c
             
-            if args.detailed and result["sections"]:
-                print("\n📋 Route details:")
-                for i, section in enumerate(result["sections"], 1):
-                    if section["type"] == "Walk":
-                        if section.get("from") and section.get("to"):
-                            print(f"   {i}. 🚶 Walk: {section['duration']} from {section['from']} to {section['to']}")
-                        else:
-                            print(f"   {i}. 🚶 Walk: {section['duration']}")
-                    else:
-                        transport = f"{section['type']} {section.get('number', '')}".strip()
-                        if section.get('name'):
-                            transport += f" ({section['name']})"
-                        platform = f" - Platform {section['platform']}" if section.get('platform') else ""
-                        print(f"   {i}. 🚂 {transport}: {section['from']} → {section['to']}{platform}")
-                        
-                        # Show departure/arrival times for this segment
-                        if section.get('departure') and section.get('arrival'):
-                            dep = datetime.fromisoformat(section['departure'].replace("Z", "+00:00"))
-                            arr = datetime.fromisoformat(section['arrival'].replace("Z", "+00:00"))
-                            print(f"      Depart: {dep.strftime('%H:%M')} → Arrive: {arr.strftime('%H:%M')}")
-                
-                # Show transfer information
-                if result["transfers"] > 0:
-                    print(f"\n🔄 Transfer details:")
-                    for i in range(len(result["sections"]) - 1):
-                        current = result["sections"][i]
-                        next_section = result["sections"][i + 1]
-                        if current["type"] != "Walk" and next_section["type"] != "Walk":
-                            transfer_station = current["to"]
-                            next_transport = f"{next_section['type']} {next_section.get('number', '')}".strip()
-                            print(f"   • At {transfer_station}: Change to {next_transport}")
-                            if next_section.get('platform'):
-                                print(f"     → Platform {next_section['platform']}")
+            stop, arr = conn_arr_stop[c], conn_arr[c]
+            if arr < arrival.get(stop, INFINITY):
+                arrival[stop] = arr
+                arrival_label[stop] = ("ride", boarded[trip], c)
+                if stop in targets:
+                    best = min(best, arr + targets[stop])
+            if arr + change_time[stop] < ready.get(stop, INFINITY):
+                ready[stop] = arr + change_time[stop]
+                ready_label[stop] = ("ride", boarded[trip], c)
+                for neighbour, seconds in self.footpaths(stop):
+                    if arr + seconds < ready.get(neighbour, INFINITY):
+                        ready[neighbour] = arr + seconds
+                        ready_label[neighbour] = ("walk", stop, seconds)
+                    if arr + seconds < arrival.get(neighbour, INFINITY):
+                        arrival[neighbour] = arr + seconds
+                        arrival_label[neighbour] = ("walk", stop, seconds)
+                        if neighbour in targets:
+                            best = min(best, arr + seconds + targets[neighbour])
+        
+        if best == INFINITY:
+            return None
+        
+        # Follow the labels back from the best target
+        target = stop = min(targets, key=lambda s: arrival.get(s, INFINITY) + targets[s])
+        legs = []
+        label = arrival_label[stop]
+        while label[0] != "source":
+            if label[0] == "ride":
+                legs.append(self.ride_leg(label[1], label[2]))
+                stop = conn_dep_stop[label[1]]
+                label = ready_label[stop]
+            else:
+                legs.append(("walk", label[1], stop, label[2]))
+                stop = label[1]
+                label = arrival_label[stop]
+        legs.reverse()
+        return add_walks(legs, stop, target, sources, targets)
+    
+    def arrival_times(self, sources, day, start, horizon=LOCAL_SEARCH_HORIZON):
+        """Scan forward from `start` seconds and return {stop: earliest arrival} for every stop reached
+        
+        A one-to-all earliest_arrival() without journeys, stopping once
+        departures are more than `horizon` seconds after the start.
+        """
+        tt = self.tt
+        active = tt.active_trips(day)
+        conn_dep, conn_arr, conn_trip = tt.conn_dep, tt.conn_arr, tt.conn_trip
+        conn_dep_stop, conn_arr_stop = tt.conn_dep_stop, tt.conn_arr_stop
+        change_time = tt.stop_change_time
+        
+        sources = stop_walks(sources)
+        arrival = {stop: start + walk for stop, walk in sources.items()}
+        ready = dict(arrival)
+        for stop, walk in sources.items():
+            for neighbour, seconds in self.footpaths(stop):
+                if start + walk + seconds < ready.get(neighbour, INFINITY):
+                    arrival[neighbour] = ready[neighbour] = start + walk + seconds
+        
+        boarded = set()
+        end = start + horizon
+        for c in range(bisect.bisect_left(conn_dep, start), len(conn_dep)):
+            dep = conn_dep[c]
+            if dep > end:
+                break
+            trip = conn_trip[c]
+            if not active[trip]:
+                continue
+            if trip not in boarded:
+                if ready.get(conn_dep_stop[c], INFINITY) > dep:
+                    continue
+                boarded.add(trip)
+            
+            stop, arr = conn_arr_stop[c], conn_arr[c]
+            if arr < arrival.get(stop, INFINITY):
+                arrival[stop] = arr
+            if arr + change_time[stop] < ready.get(stop, INFINITY):
+                ready[stop] = arr + change_time[stop]
+                for neighbour, seconds in self.footpaths(stop):
+                    if arr + seconds < ready.get(neighbour, INFINITY):
+                        ready[neighbour] = arr + seconds
+                    if arr + seconds < arrival.get(neighbour, INFINITY):
+                        arrival[neighbour] = arr + seconds
+        return arrival
+    
+    def latest_departure(self, sources, targets, day, deadline):
+        """Scan backward from `deadline` seconds and return the legs of the latest-departing journey
+        
+        The mirror image of earliest_arrival(): each stop keeps the latest time a
+        journey can start there, and the latest time a vehicle may arrive there
+        leaving room to change.
+        """
+        tt = self.tt
+        active = tt.active_trips(day)
+        conn_dep, conn_arr, conn_trip = tt.conn_dep, tt.conn_arr, tt.conn_trip
+        conn_dep_stop, conn_arr_stop = tt.conn_dep_stop, tt.conn_arr_stop
+        change_time = tt.stop_change_time
+        
+        sources, targets = stop_walks(sources), stop_walks(targets)
+        departure, latest = {}, {}
+        departure_label, latest_label = {}, {}
+        for stop, walk in targets.items():
+            departure[stop] = latest[stop] = deadline - walk
+            departure_label[stop] = latest_label[stop] = ("target",)
+        for stop, walk in targets.items():
+            for neighbour, seconds in self.incoming_footpaths(stop):
+                if deadline - walk - seconds > latest.get(neighbour, -INFINITY):
+                    departure[neighbour] = latest[neighbour] = deadline - walk - seconds
+                    departure_label[neighbour] = latest_label[neighbour] = ("walk", stop, seconds)
+        
+        best = max((departure.get(stop, -INFINITY) - walk for stop, walk in sources.items()),
+                   default=-INFINITY)
+        alighted = {}
+        end = deadline - LOCAL_SEARCH_HORIZON
+        for c in range(bisect.bisect_right(conn_dep, deadline) - 1, -1, -1):
+            dep = conn_dep[c]
+            if dep <= best or dep < end:
+                break
+            trip = conn_trip[c]
+            if not active[trip]:
+                continue
+            if trip not in alighted:
+                if conn_arr[c] > latest.get(conn_arr_stop[c], -INFINITY):
+                    continue
+                alighted[trip] = c
             
-            # Parse and format times
-            dep_time = datetime.fromisoformat(result["departure"].replace("Z", "+00:00"))
-            arr_time = datetime.fromisoformat(result["arrival"].replace("Z", "+00:00"))
-            print(f"\n🕐 Next departure: {dep_time.strftime('%H:%M')} → Arrival: {arr_time.strftime('%H:%M')}")
+            stop = conn_dep_stop[c]
+            if dep > departure.get(stop, -INFINITY):
+                departure[stop] = dep
+                departure_label[stop] = ("ride", c, alighted[trip])
+                if stop in sources:
+                    best = max(best, dep - sources[stop])
+            if dep - change_time[stop] > latest.get(stop, -INFINITY):
+                latest[stop] = dep - change_time[stop]
+                latest_label[stop] = ("ride", c, alighted[trip])
+                for neighbour, seconds in self.incoming_footpaths(stop):
+                    if dep - seconds > latest.get(neighbour, -INFINITY):
+                        latest[neighbour] = dep - seconds
+                        latest_label[neighbour] = ("walk", stop, seconds)
+                    if dep - seconds > departure.get(neighbour, -INFINITY):
+                        departure[neighbour] = dep - seconds
+                        departure_label[neighbour] = ("walk", stop, seconds)
+                        if neighbour in sources:
+                            best = max(best, dep - seconds - sources[neighbour])
+        
+        if best == -INFINITY:
+            return None
+        
+        # Follow the labels forward from the best source
+        source = stop = max(sources, key=lambda s: departure.get(s, -INFINITY) - sources[s])
+        legs = []
+        label = departure_label[stop]
+        while label[0] != "target":
+            if label[0] == "ride":
+                legs.append(self.ride_leg(label[1], label[2]))
+                stop = conn_arr_stop[label[2]]
+                label = latest_label[stop]
+            else:
+                legs.append(("walk", stop, label[1], label[2]))
+                stop = label[1]
+                label = departure_label[stop]
+        return add_walks(legs, source, stop, sources, targets)
+    
+    def earliest_trip(self, pattern, position, ready, active):
+        """Return the first active trip of a pattern leaving `position` at or after `ready`, or -1"""
+        tt = self.tt
+        tso, st_dep = tt.trip_st_offsets, tt.st_dep
+        lo, hi = tt.pattern_trip_offsets[pattern], tt.pattern_trip_offsets[pattern + 1]
+        # Trips of a pattern are sorted by departure and don't overtake each other
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if st_dep[tso[mid] + position] < ready:
+                lo = mid + 1
+            else:
+                hi = mid
+        for trip in range(lo, tt.pattern_trip_offsets[pattern + 1]):
+            if active[trip]:
+                return trip
+        return -1
+    
+    def raptor(self, sources, targets, day, start, max_transfers=MAX_TRANSFERS, best=None):
+        """Round-based (RAPTOR) search from `start` seconds
+        
+        Round k finds the earliest arrival at every stop using at most k
+        vehicles. Returns the Pareto set of journeys by (arrival, transfers) as
+        a list of (arrival, transfers, legs), fewest transfers first.
+        
+        `best` may carry the earliest arrivals at each stop over from a search
+        with a later start (range-RAPTOR); it is updated in place, and only
+        journeys arriving earlier than those are returned.
+        """
+        tt = self.tt
+        active = tt.active_trips(day)
+        pso, pattern_stops = tt.pattern_stop_offsets, tt.pattern_stops
+        tso, st_arr, st_dep = tt.trip_st_offsets, tt.st_arr, tt.st_dep
+        change_time = tt.stop_change_time
+        sources, targets = stop_walks(sources), stop_walks(targets)
+        
+        # Round 0: the sources, and whatever can be walked to from them
+        arrivals = {stop: start + walk for stop, walk in sources.items()}
+        round_labels = {stop: ("source",) for stop in sources}
+        for stop, walk in sources.items():
+            for neighbour, seconds in self.footpaths(stop):
+                if start + walk + seconds < arrivals.get(neighbour, INFINITY):
+                    arrivals[neighbour] = start + walk + seconds
+                    round_labels[neighbour] = ("walk", stop, seconds)
+        labels = [round_labels]
+        times = [arrivals]
+        # Earliest time a vehicle can be boarded at each stop, and the round that got us there
+        ready = {stop: (time, 0) for stop, time in arrivals.items()}
+        marked = set(arrivals)
+        
+        if best is None:
+            best = {}
+        journeys = []
+        best_target = min((best.get(stop, INFINITY) + walk for stop, walk in targets.items()),
+                          default=INFINITY)
+        arrival = min((arrivals.get(stop, INFINITY) + walk for stop, walk in targets.items()),
+                      default=INFINITY)
+        if arrival < best_target:
+            best_target = arrival
+            journeys.append((arrival, 0, 0))
+        for stop, time in arrivals.items():
+            if time < best.get(stop, INFINITY):
+                best[stop] = time
+        
+        for k in range(1, max_transfers + 2):
+            # Scan each pattern serving a marked stop from the first such stop
+            queue = {}
+            for stop in marked:
+                for pattern, position in tt.patterns_at(stop):
+                    if position < queue.get(pattern, INFINITY):
+                        queue[pattern] = position
+            
+            round_labels, round_times = {}, {}
+            for pattern, position in queue.items():
+                first = pso[pattern]
+                trip, board, board_round = -1, 0, 0
+                for i in range(position, pso[pattern + 1] - first):
+                    stop = pattern_stops[first + i]
+                    if trip >= 0:
+                        arr = st_arr[tso[trip] + i]
+                        if arr < best.get(stop, INFINITY) and arr < best_target:
+                            best[stop] = round_times[stop] = arr
+                            round_labels[stop] = ("ride", trip, board, i, board_round, pattern)
+                            if stop in targets:
+                                best_target = min(best_target, arr + targets[stop])
+                    # Hop on an earlier trip if we can be here in time for it
+                    if stop in ready:
+                        time, reached_round = ready[stop]
+                        if trip < 0 or time <= st_dep[tso[trip] + i]:
+                            earlier = self.earliest_trip(pattern, i, time, active)
+                            if earlier >= 0 and earlier != trip:
+                                trip, board, board_round = earlier, i, reached_round
+            
+            # Footpaths from the stops reached by a vehicle in this round
+            for stop, arr in list(round_times.items()):
+                for neighbour, seconds in self.footpaths(stop):
+                    if arr + seconds < best.get(neighbour, INFINITY) and arr + seconds < best_target:
+                        best[neighbour] = round_times[neighbour] = arr + seconds
+                        round_labels[neighbour] = ("walk", stop, seconds)
+                        if neighbour in targets:
+                            best_target = min(best_target, arr + seconds + targets[neighbour])
+            labels.append(round_labels)
+            times.append(round_times)
+            
+            marked = set(round_labels)
+            for stop in marked:
+                time = round_times[stop] + (change_time[stop] if round_labels[stop][0] == "ride" else 0)
+                if time < ready.get(stop, (INFINITY, 0))[0]:
+                    ready[stop] = (time, k)
+            
+            # A journey using k vehicles is Pareto-optimal if it arrives earlier
+            # than every journey with fewer
+            arrival = min((round_times[stop] + walk for stop, walk in targets.items()
+                           if stop in round_times), default=INFINITY)
+            if arrival < INFINITY and (not journeys or arrival < journeys[-1][0]):
+                if journeys and journeys[-1][1] == k - 1:
+                    journeys.pop()  # Beats walking with the same number of transfers
+                journeys.append((arrival, max(k - 1, 0), k))
+            if not marked:
+                break
+        
+        # Follow each Pareto-optimal round's labels back to the source
+        results = []
+        for arrival, transfers, k in journeys:
+            target = stop = min((s for s in targets if s in times[k]),
+                                key=lambda s: times[k][s] + targets[s])
+            legs = []
+            label = labels[k][stop]
+            while label[0] != "source":
+                if label[0] == "ride":
+                    _, trip, board, alight, board_round, pattern = label
+                    board_stop = pattern_stops[pso[pattern] + board]
+                    legs.append(("ride", trip, board_stop, stop,
+                                 st_dep[tso[trip] + board], st_arr[tso[trip] + alight]))
+                    stop, k = board_stop, board_round
+                else:
+                    legs.append(("walk", label[1], stop, label[2]))
+                    stop = label[1]
+                label = labels[k][stop]
+            legs.reverse()
+            results.append((arrival, transfers, add_walks(legs, stop, target, sources, targets)))
+        return results
+    
+    def departures_from(self, stops, day, earliest, latest):
+        """Return the distinct times in a range to leave for any active trip from the stops
+        
+        With walks to the stops, these are the times to start walking.
+        """
+        tt = self.tt
+        active = tt.active_trips(day)
+        times = set()
+        for stop, walk in stop_walks(stops).items():
+            for pattern, position in tt.patterns_at(stop):
+                trip = self.earliest_trip(pattern, position, earliest + walk, active)
+                while 0 <= trip < tt.pattern_trip_offsets[pattern + 1]:
+                    dep = tt.st_dep[tt.trip_st_offsets[trip] + position]
+                    if dep - walk > latest:
+                        break
+                    if active[trip]:
+                        times.add(dep - walk)
+                    trip += 1
+        return sorted(times)
+    
+    def profile(self, sources, targets, day, earliest, latest):
+        """Return every non-dominated (departure, arrival, transfers, legs) leaving in a time range
+        
+        Runs range-RAPTOR: one search per departure from the sources, latest
+        first, sharing earliest arrivals between runs. A run only finds
+        something if it arrives earlier than every later departure does.
+        """
+        best = {}
+        journeys = []
+        for start in reversed(self.departures_from(sources, day, earliest, latest)):
+            found = self.raptor(sources, targets, day, start, best=best)
+            if found:
+                arrival, transfers, legs = found[-1]
+                journeys.append((journey_times(legs, start)[0], arrival, transfers, legs))
+        journeys.reverse()
+        return journeys
+    
+    def get_profile(self, from_location, to_location, start, end, fields=None):
+        """Find all non-dominated connections leaving between two datetimes; see get_profile()"""
+        sources = self.stops_for(from_location)
+        targets = self.stops_for(to_location)
+        places = (place_name(from_location), place_name(to_location))
+        for name, stops in zip(places, (sources, targets)):
+            if not stops:
+                return {"status": "ERROR", "message": f"'{name}' is not in the local timetable"}
+        
+        day = start.date()
+        journeys = self.profile(sources, targets, day,
+                                start.hour * 3600 + start.minute * 60,
+                                end.hour * 3600 + end.minute * 60)
+        if not journeys:
+            return {"status": "ERROR", "message": "No connections found"}
+        connections = [self.build_connection(legs, day, places) for _, _, _, legs in journeys]
+        return {"status": "OK", "connections": connections}
+    
+    def pareto_journeys(self, sources, targets, day, starts, workers=1):
+        """Run raptor() for each start time and return every (departure, arrival, transfers, legs)
+        
+        With workers > 1 the start times are spread over separate processes,
+        each memory-mapping the same timetable file.
+        """
+        if workers > 1 and len(starts) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                runs = list(executor.map(raptor_worker, repeat(self.tt.path), repeat(sources),
+                                         repeat(targets), repeat(day), starts))
         else:
-            print(f"❌ Error: {result['message']}")
+            runs = [self.raptor(sources, targets, day, start) for start in starts]
         
-        print()
+        journeys = []
+        for start, run in zip(starts, runs):
+            for arrival, transfers, legs in run:
+                departure, _ = journey_times(legs, start)
+                journeys.append((departure, arrival, transfers, legs))
+        return journeys
+
+    def ride_leg(self, board, alight):
+        """Build a ride leg from the connections where a trip is boarded and left
+        
+        Legs are ("ride", trip, from_stop, to_stop, departure, arrival) or
+        ("walk", from_stop, to_stop, seconds).
+        """
+        tt = self.tt
+        return ("ride", tt.conn_trip[board], tt.conn_dep_stop[board], tt.conn_arr_stop[alight],
+                tt.conn_dep[board], tt.conn_arr[alight])
     
-    print("=" * 60)
-    print(f"🕐 Calculated at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"\n💡 Use {Colors.GREEN}-h{Colors.ENDC} or {Colors.GREEN}--help{Colors.ENDC} to see all options and examples")
+    def build_connection(self, legs, day, places=("", "")):
+        """Turn router legs into a Connection like parse_connection() returns
+        
+        `places` names the origin and destination for walks to and from them.
+        """
+        tt = self.tt
+        # Timetable times are local; they are kept as such, see Connection
+        midnight = int((datetime(day.year, day.month, day.day) - EPOCH).total_seconds())
+        
+        sections = []
+        rides = [leg for leg in legs if leg[0] == "ride"]
+        for leg in legs:
+            if leg[0] == "walk":
+                _, from_stop, to_stop, seconds = leg
+                from_name = places[0] if from_stop is None else tt.stop_name(from_stop)
+                to_name = places[1] if to_stop is None else tt.stop_name(to_stop)
+                # Changing platforms within a station isn't shown as a walk
+                if from_name != to_name:
+                    sections.append(Section(category="Walk", duration=seconds, origin=from_name,
+                                            destination=to_name))
+                continue
+            
+            _, trip, from_stop, to_stop, departure, arrival = leg
+            route = tt.trip_route[trip]
+            category = tt.string("route_categories", route) if route >= 0 else "Transport"
+            line = tt.string("route_names", route) if route >= 0 else ""
+            sections.append(Section(
+                category=category,
+                number=tt.string("trip_names", trip) or line,
+                name=line,
+                origin=tt.stop_name(from_stop),
+                destination=tt.stop_name(to_stop),
+                departure=midnight + departure,
+                arrival=midnight + arrival,
+                duration=arrival - departure,
+                platform=platform_of(tt.stop_id(from_stop))
+            ))
+        
+        departure, arrival = journey_times(legs)
+        return Connection(departure=midnight + departure,
+                          arrival=midnight + arrival,
+                          transfers=max(len(rides) - 1, 0),
+                          sections=tuple(sections))
+    
+    def get_pareto_connections(self, sources, targets, day, seconds, arrive_by, places=("", "")):
+        """Find every journey that is best for its number of transfers
+        
+        Departing at `seconds`, that is the Pareto set by (arrival, transfers).
+        Arriving by `seconds`, it is the set by (departure, transfers) among
+        RAPTOR runs for each departure in the preceding PARETO_WINDOW.
+        """
+        if arrive_by:
+            starts = self.departures_from(sources, day, seconds - PARETO_WINDOW, seconds)
+            journeys = [journey for journey in
+                        self.pareto_journeys(sources, targets, day, starts, self.workers)
+                        if journey[1] <= seconds]
+            # Keep the latest departure for each number of transfers, then
+            # drop those that need more transfers to leave no later
+            latest = {}
+            for journey in journeys:
+                if journey[2] not in latest or journey[0] > latest[journey[2]][0]:
+                    latest[journey[2]] = journey
+            front = []
+            for transfers in sorted(latest):
+                if not front or latest[transfers][0] > front[-1][0]:
+                    front.append(latest[transfers])
+        else:
+            front = [(None, arrival, transfers, legs) for arrival, transfers, legs
+                     in self.raptor(sources, targets, day, seconds)]
+        
+        if not front:
+            return {"status": "ERROR", "message": "No connections found"}
+        # Best first: the latest departure when arriving by a time, else the earliest arrival
+        if arrive_by:
+            front.sort(key=lambda j: (-j[0], j[2]))
+        else:
+            front.sort(key=lambda j: (j[1], j[2]))
+        connections = [self.build_connection(legs, day, places) for _, _, _, legs in front]
+        return {"status": "OK", "connections": connections}
+    
+    def get_connections(self, from_location, to_location, arrival_time=None, limit=1, fields=None,
+                        departure_time=None):
+        """Find connections in the local timetable; see get_connections()"""
+        sources = self.stops_for(from_location)
+        targets = self.stops_for(to_location)
+        places = (place_name(from_location), place_name(to_location))
+        for name, stops in zip(places, (sources, targets)):
+            if not stops:
+                return {"status": "ERROR", "message": f"'{name}' is not in the local timetable"}
+        
+        when = arrival_time or departure_time
+        when = datetime.fromisoformat(when) if when else datetime.now()
+        day = when.date()
+        seconds = when.hour * 3600 + when.minute * 60 + when.second
+        
+        if self.pareto:
+            return self.get_pareto_connections(sources, targets, day, seconds, bool(arrival_time),
+                                               places)
+        
+        # Each further connection departs just after (or, for arrival
+        # queries, arrives just before) the previous one
+        connections = []
+        for _ in range(limit):
+            if arrival_time:
+                legs = self.latest_departure(sources, targets, day, seconds)
+            else:
+                legs = self.earliest_arrival(sources, targets, day, seconds)
+            if not legs:
+                break
+            connections.append(self.build_connection(legs, day, places))
+            if not any(leg[0] == "ride" for leg in legs):
+                break  # Walking all the way; no later connection is better
+            departure, arrival = journey_times(legs)
+            seconds = arrival - 1 if arrival_time else departure + 1
+        
+        if not connections:
+            return {"status": "ERROR", "message": "No connections found"}
+        if arrival_time:
+            connections.reverse()
+        return {"status": "OK", "connections": connections}
+
+_worker_router = None
+
+def raptor_worker(path, sources, targets, day, start):
+    """Run LocalRouter.raptor() in a worker process, loading the timetable once per process"""
+    global _worker_router
+    if _worker_router is None or _worker_router.tt.path != path:
+        _worker_router = LocalRouter(Timetable(path))
+    return _worker_router.raptor(sources, targets, day, start)
+
+def import_gtfs_main(argv):
+    """Import a GTFS feed into the offline timetable store"""
+    parser = argparse.ArgumentParser(
+        prog=f"{os.path.basename(sys.argv[0])} import-gtfs",
+        description=f"{Colors.BOLD}{Colors.HEADER}🚉 Import a GTFS timetable{Colors.ENDC}\n"
+                    f"{Colors.CYAN}Convert a GTFS feed (.zip or directory) into a compact store for offline use{Colors.ENDC}",
+        formatter_class=ColoredHelpFormatter)
+    parser.add_argument("feed", 
+                       help="GTFS feed, e.g. the Swiss feed from opentransportdata.swiss")
+    parser.add_argument("--output", 
+                       metavar="FILE",
+                       default=default_timetable_path(),
+                       help=f"Where to write the timetable store (default: {default_timetable_path()})")
+    
+    args = parser.parse_args(argv)
+    
+    import zipfile
+    print(f"📥 Importing {args.feed}...")
+    started = time.monotonic()
+    try:
+        import_gtfs(args.feed, args.output)
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        print(f"Error: Could not import {args.feed}: {e}")
+        sys.exit(1)
+    print(f"✅ Wrote {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB) "
+          f"in {time.monotonic() - started:.1f}s")
+    
+    started = time.monotonic()
+    Timetable(args.output).close()
+    print(f"⚡ Loads in {(time.monotonic() - started) * 1000:.1f} ms")
+
+# Isochrones: how far one gets from an origin within a few time budgets,
+# walking the rest of the way from whichever stop is reached first
+ISOCHRONE_MINUTES = [30, 45, 60]
+ISOCHRONE_CELL = 200
+ISOCHRONE_RADIUS = 10
+
+def require_numpy(command):
+    """Import NumPy, exiting with an explanation if it isn't installed"""
+    try:
+        import numpy
+    except ImportError:
+        print(f"Error: the {command} command needs NumPy. Install it with: pip install numpy")
+        sys.exit(1)
+    return numpy
+
+def search_nearby(x, y):
+    """Return the stations the API knows near a coordinate, nearest first"""
+    try:
+        data = get_client().get("locations", {"x": x, "y": y, "type": "station"})
+        return [Location.from_api(station) for station in data["stations"] if station.get("id")]
+    except Exception as e:
+        print(f"Error searching near {x},{y}: {e}", file=sys.stderr)
+        return []
+
+def minutes_to(from_location, to_location, when):
+    """Return the minutes from `when` until arriving at a location, or None"""
+    result = get_connections(from_location, to_location, fields="summary",
+                             departure_time=when.strftime("%Y-%m-%dT%H:%M"))
+    if result["status"] != "OK":
+        return None
+    conn = result["connections"][0]
+    return max(0, (conn.local_time(conn.arrival) - when).total_seconds() / 60)
+
+def reachable_stops_api(origin, when, limit, radius, executor):
+    """Return [(latitude, longitude, minutes)] for the stations within `radius` km reached in time
+    
+    Stations are discovered by looking up a ring of points around the origin,
+    then every station's earliest arrival is fetched with one (cached)
+    connection request, `executor` running them concurrently.
+    """
+    step = radius / 4
+    points = []
+    for i in range(-4, 5):
+        for j in range(-4, 5):
+            if i * i + j * j <= 16:
+                points.append((origin.x + i * step * 1000 / METRES_PER_DEGREE,
+                               origin.y + j * step * 1000 / (METRES_PER_DEGREE * math.cos(math.radians(origin.x)))))
+    
+    stations = {}
+    for found in executor.map(lambda point: search_nearby(*point), points):
+        for station in found:
+            if station.x is not None and station.id != origin.id:
+                stations.setdefault(station.id, station)
+    stations = list(stations.values())
+    
+    stops = [(origin.x, origin.y, 0)]
+    for station, minutes in zip(stations, executor.map(minutes_to, repeat(origin), stations,
+                                                       repeat(when))):
+        if minutes is not None and minutes <= limit:
+            stops.append((station.x, station.y, minutes))
+    return stops
+
+def reachable_stops_local(router, origin, when, limit):
+    """Return [(latitude, longitude, minutes)] for the timetable stops reached in time"""
+    tt = router.tt
+    sources = router.stops_for(origin)
+    if not sources:
+        return None
+    start = when.hour * 3600 + when.minute * 60
+    arrivals = router.arrival_times(sources, when.date(), start, limit * 60)
+    
+    stops = []
+    if origin.x is not None and origin.y is not None:
+        stops.append((origin.x, origin.y, 0))
+    for stop, arrival in arrivals.items():
+        if arrival - start <= limit * 60:
+            stops.append((tt.stop_lat[stop], tt.stop_lon[stop], (arrival - start) / 60))
+    return stops
+
+def reachable_stops(origin, when, limit, radius, jobs):
+    """Return {"status": "OK", "stops": [(latitude, longitude, minutes)]} for the stops reached in time
+    
+    Uses the server, the local router or the API, like get_connections().
+    Returns an ERROR dict if the origin can't be routed from.
+    """
+    if _server is not None:
+        return _server.reachable_stops(origin, when, limit, radius, jobs)
+    if _router is not None:
+        stops = reachable_stops_local(_router, origin, when, limit)
+        if stops is None:
+            return {"status": "ERROR", "message": f"'{origin.name}' is not in the local timetable"}
+        return {"status": "OK", "stops": stops}
+    
+    if origin.x is None or origin.y is None:
+        return {"status": "ERROR", "message": f"No coordinates known for '{origin.name}'"}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return {"status": "OK", "stops": reachable_stops_api(origin, when, limit, radius, executor)}
+
+def travel_time_grid(stops, limit, cell):
+    """Interpolate minutes of travel onto a grid of `cell`-metre squares
+    
+    Each cell takes the best over all stops of the time to reach the stop
+    plus the walk from it, with the same detour as walk_seconds(). Returns (minutes, origin latitude, origin
+    longitude, metres per degree of longitude, west edge, south edge), with
+    the edges in metres from the first stop.
+    """
+    np = require_numpy("isochrone")
+    data = np.array(stops, dtype=float)
+    lat0, lon0 = data[0, 0], data[0, 1]
+    x_scale = METRES_PER_DEGREE * math.cos(math.radians(lat0))
+    xs = (data[:, 1] - lon0) * x_scale
+    ys = (data[:, 0] - lat0) * METRES_PER_DEGREE
+    minutes = data[:, 2]
+    
+    # Only as far as the walk from each stop can get within the limit
+    reach = (limit - minutes) * 60 * WALK_SPEED / WALK_DETOUR
+    west = np.floor((xs - reach).min() / cell) * cell
+    south = np.floor((ys - reach).min() / cell) * cell
+    columns = int(np.ceil(((xs + reach).max() - west) / cell))
+    rows = int(np.ceil(((ys + reach).max() - south) / cell))
+    
+    cx = west + (np.arange(columns) + 0.5) * cell
+    grid = np.empty((rows, columns))
+    # A few rows at a time, keeping the rows × columns × stops distances small
+    chunk = max(1, 2_000_000 // max(1, columns * len(minutes)))
+    for r in range(0, rows, chunk):
+        cy = south + (np.arange(r, min(rows, r + chunk)) + 0.5) * cell
+        dx = cx[None, :, None] - xs[None, None, :]
+        dy = cy[:, None, None] - ys[None, None, :]
+        walk = np.sqrt(dx * dx + dy * dy) * WALK_DETOUR / (WALK_SPEED * 60)
+        grid[r:r + len(cy)] = (minutes + walk).min(axis=2)
+    return grid, lat0, lon0, x_scale, west, south
+
+def trace_outlines(mask):
+    """Return the outlines of the True cells of a 2-D mask as rings of (column, row) corners
+    
+    Edges are directed with the cells on their left, so outer rings run
+    anticlockwise and holes clockwise (with rows increasing northwards).
+    Where two cells only touch at a corner, they get separate rings.
+    """
+    np = require_numpy("isochrone")
+    padded = np.pad(mask, 1)
+    inside = padded[1:-1, 1:-1]
+    edges = {}
+    # (neighbour offset, edge start, edge end) for each side of a cell
+    for (dr, dc), start, end in (((-1, 0), (0, 0), (1, 0)),
+                                 ((0, 1), (1, 0), (1, 1)),
+                                 ((1, 0), (1, 1), (0, 1)),
+                                 ((0, -1), (0, 1), (0, 0))):
+        neighbour = padded[1 + dr:padded.shape[0] - 1 + dr, 1 + dc:padded.shape[1] - 1 + dc]
+        for r, c in zip(*np.nonzero(inside & ~neighbour)):
+            edges.setdefault((int(c) + start[0], int(r) + start[1]), []).append(
+                (int(c) + end[0], int(r) + end[1]))
+    
+    rings = []
+    while edges:
+        first = next(iter(edges))
+        ring = [first]
+        point = first
+        direction = None
+        while True:
+            choices = edges[point]
+            if len(choices) > 1 and direction:
+                # Turn left at a corner shared by two cells
+                left = (-direction[1], direction[0])
+                choices.sort(key=lambda p: (p[0] - point[0], p[1] - point[1]) != left)
+            following = choices.pop(0)
+            if not choices:
+                del edges[point]
+            direction = (following[0] - point[0], following[1] - point[1])
+            point = following
+            if point == first:
+                break
+            ring.append(point)
+        
+        # Drop the corners where the outline goes straight on
+        simplified = [p for i, p in enumerate(ring)
+                      if (ring[i - 1][0] - p[0]) * (ring[(i + 1) % len(ring)][1] - p[1])
+                      != (ring[i - 1][1] - p[1]) * (ring[(i + 1) % len(ring)][0] - p[0])]
+        rings.append(simplified + simplified[:1])
+    return rings
+
+def ring_area(ring):
+    """Signed area of a closed ring, positive when anticlockwise"""
+    return sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(ring, ring[1:])) / 2
+
+def ring_contains(ring, point):
+    """Whether a point lies inside a closed ring (even-odd rule)"""
+    x, y = point
+    inside = False
+    for (x0, y0), (x1, y1) in zip(ring, ring[1:]):
+        if (y0 > y) != (y1 > y) and x < x0 + (y - y0) * (x1 - x0) / (y1 - y0):
+            inside = not inside
+    return inside
+
+def outline_polygons(rings):
+    """Group outline rings into polygons: each outer ring followed by its holes"""
+    outers = [ring for ring in rings if ring_area(ring) > 0]
+    polygons = {id(ring): [ring] for ring in outers}
+    for hole in rings:
+        if ring_area(hole) > 0:
+            continue
+        # The centre of the cell to the left of the hole's first edge
+        (x0, y0), (x1, y1) = hole[0], hole[1]
+        dx, dy = (x1 > x0) - (x1 < x0), (y1 > y0) - (y1 < y0)
+        centre = ((x0 + x1) / 2 - dy / 2, (y0 + y1) / 2 + dx / 2)
+        around = [ring for ring in outers if ring_contains(ring, centre)]
+        if around:
+            polygons[id(min(around, key=ring_area))].append(hole)
+    return list(polygons.values())
+
+def isochrone_features(stops, budgets, cell, properties):
+    """Build one GeoJSON MultiPolygon feature per time budget, largest first"""
+    grid, lat0, lon0, x_scale, west, south = travel_time_grid(stops, max(budgets), cell)
+    
+    def coordinates(corner):
+        return [round(lon0 + (west + corner[0] * cell) / x_scale, 6),
+                round(lat0 + (south + corner[1] * cell) / METRES_PER_DEGREE, 6)]
+    
+    features = []
+    for minutes in sorted(budgets, reverse=True):
+        polygons = outline_polygons(trace_outlines(grid <= minutes))
+        features.append({
+            "type": "Feature",
+            "properties": dict(properties, minutes=minutes),
+            "geometry": {
+                "type": "MultiPolygon",
+                "coordinates": [[[coordinates(corner) for corner in ring] for ring in polygon]
+                                for polygon in polygons]
+            }
+        })
+    return features
+
+def isochrone_main(argv):
+    """Write GeoJSON areas reachable from an address within a few time budgets"""
+    parser = argparse.ArgumentParser(
+        prog=f"{os.path.basename(sys.argv[0])} isochrone",
+        description=f"{Colors.BOLD}{Colors.HEADER}🚉 Isochrones{Colors.ENDC}\n"
+                    f"{Colors.CYAN}GeoJSON areas reachable from an address by public transport and on foot{Colors.ENDC}",
+        formatter_class=ColoredHelpFormatter)
+    parser.add_argument("address", 
+                       help="Starting address or location")
+    parser.add_argument("--minutes", "-m", 
+                       metavar="N,N,...",
+                       default=",".join(map(str, ISOCHRONE_MINUTES)),
+                       help="Travel time budgets in minutes (default: %(default)s)")
+    parser.add_argument("--depart", 
+                       metavar="HH:MM",
+                       help="Departure time (default: now)")
+    parser.add_argument("--date", 
+                       metavar="YYYY-MM-DD",
+                       help="Specific date for departure (default: next weekday)")
+    parser.add_argument("--cell", 
+                       metavar="METRES",
+                       type=float,
+                       default=ISOCHRONE_CELL,
+                       help=f"Size of the grid squares (default: {ISOCHRONE_CELL})")
+    parser.add_argument("--radius", 
+                       metavar="KM",
+                       type=float,
+                       default=ISOCHRONE_RADIUS,
+                       help=f"With the API backend, how far around the origin to look for stations (default: {ISOCHRONE_RADIUS})")
+    parser.add_argument("--output", 
+                       metavar="FILE",
+                       help="Write GeoJSON to FILE instead of standard output")
+    add_lookup_arguments(parser, rate=DEFAULT_MATRIX_RATE)
+    
+    args = parser.parse_args(argv)
+    try:
+        budgets = sorted({int(m) for m in args.minutes.split(",") if m.strip()})
+        if not budgets or budgets[0] <= 0:
+            raise ValueError
+    except ValueError:
+        parser.error("--minutes must be positive whole numbers, e.g. 30,45,60")
+    if args.cell <= 0 or args.radius <= 0:
+        parser.error("--cell and --radius must be positive")
+    try:
+        when = parse_arrival_time(args.depart or datetime.now().strftime("%H:%M"), args.date)
+    except ValueError:
+        parser.error("Invalid time format. Use HH:MM (e.g., 08:30)")
+    require_numpy("isochrone")
+    
+    setup_lookups(parser, args)
+    
+    origin = search_location(args.address)
+    if not origin:
+        print(f"Error: Could not find location '{args.address}'")
+        sys.exit(1)
+    
+    print(f"🗺️  Isochrones from {origin.name}, departing {when.strftime('%Y-%m-%d %H:%M')}",
+          file=sys.stderr)
+    result = reachable_stops(origin, when, budgets[-1], args.radius, args.jobs)
+    if result["status"] != "OK":
+        print(f"Error: {result['message']}")
+        sys.exit(1)
+    stops = result["stops"]
+    print(f"🚏 {len(stops)} stops reachable within {budgets[-1]} min", file=sys.stderr)
+    
+    features = isochrone_features(stops, budgets, args.cell, {
+        "origin": origin.name,
+        "departure": when.strftime("%Y-%m-%dT%H:%M")
+    })
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        json.dump({"type": "FeatureCollection", "features": features}, out, ensure_ascii=False)
+        out.write("\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    
+    close_lookups()
+
+# Departure board: the next departures from one station, from the stationboard
+# endpoint, redrawn in place at an interval
+BOARD_ROWS = 12
+BOARD_REFRESH = 30
+# Departures fetched per request when filters may hide many of them
+BOARD_FETCH_LIMIT = 60
+
+# Only the stationboard fields the board shows, leaving out every pass list
+BOARD_FIELDS = [
+    "station/name",
+    "stationboard/stop/departure",
+    "stationboard/stop/delay",
+    "stationboard/stop/platform",
+    "stationboard/stop/prognosis/platform",
+    "stationboard/stop/prognosis/departure",
+    "stationboard/category",
+    "stationboard/number",
+    "stationboard/to",
+]
+
+@dataclass(**SLOTS)
+class Departure:
+    """One row of a departure board; times are seconds since the epoch"""
+    departure: int
+    category: str
+    number: str
+    destination: str
+    platform: str = ""
+    # Expected departure, including any delay
+    expected: int = None
+    utc_offset: int = None
+    
+    @property
+    def line(self):
+        """The category and number, e.g. 'IR 90' or 'B 805'"""
+        return f"{self.category} {self.number}".strip()
+    
+    @property
+    def delay(self):
+        """Minutes late"""
+        return (self.expected - self.departure) // 60
+
+def parse_departure(entry):
+    """Build a Departure from an entry of the API's 'stationboard' list"""
+    stop = entry["stop"]
+    departure, utc_offset = parse_timestamp(stop["departure"])
+    prognosis = stop.get("prognosis") or {}
+    if prognosis.get("departure"):
+        expected = parse_timestamp(prognosis["departure"])[0]
+    else:
+        expected = departure + (stop.get("delay") or 0) * 60
+    return Departure(departure=departure,
+                     category=entry.get("category") or "",
+                     number=entry.get("number") or "",
+                     destination=entry.get("to") or "",
+                     platform=prognosis.get("platform") or stop.get("platform") or "",
+                     expected=expected,
+                     utc_offset=utc_offset)
+
+def board_filter(lines=None, categories=None, destinations=None):
+    """Return a predicate for departures matching every given filter
+    
+    A line matches its number or its category and number ('90', 'IR90',
+    'IR 90'), a category its category, and a destination any part of the
+    departure's destination, ignoring case and accents.
+    """
+    lines = {line.replace(" ", "").casefold() for line in lines or []}
+    categories = {category.casefold() for category in categories or []}
+    destinations = [fold_name(destination) for destination in destinations or []]
+    
+    def matches(departure):
+        if lines and not {departure.number.casefold(),
+                          f"{departure.category}{departure.number}".casefold()} & lines:
+            return False
+        if categories and departure.category.casefold() not in categories:
+            return False
+        if destinations:
+            folded = fold_name(departure.destination)
+            if not any(destination in folded for destination in destinations):
+                return False
+        return True
+    
+    return matches
+
+def get_departures(station, limit=BOARD_ROWS, matches=None):
+    """Fetch the next departures from a station Location (by id) matching a filter
+    
+    Returns a dict with "status" and, when OK, "station" (its name) and
+    "departures" (at most `limit`).
+    """
+    params = {
+        "id": station.id,
+        "limit": BOARD_FETCH_LIMIT if matches else limit,
+        "fields[]": BOARD_FIELDS
+    }
+    try:
+        data = get_client().get("stationboard", params)
+        departures = [parse_departure(entry) for entry in data.get("stationboard") or []
+                      if entry.get("stop", {}).get("departure")]
+    except Exception as e:
+        return {"status": "ERROR", "message": str(e)}
+    if matches:
+        departures = [departure for departure in departures if matches(departure)]
+    name = (data.get("station") or {}).get("name") or station.name
+    return {"status": "OK", "station": name, "departures": departures[:limit]}
+
+def board_lines(result, now):
+    """Render a get_departures() result as the lines of the board"""
+    lines = [f"{Colors.BOLD}{'Time':<5}  {'In':>6}  {'Line':<8}  {'Destination':<28}  Platform{Colors.ENDC}"]
+    for departure in result["departures"]:
+        minutes = max(0, int(departure.expected - now) // 60)
+        clock = local_clock(departure.departure, departure.utc_offset)
+        delay = f" {Colors.RED}+{departure.delay}{Colors.ENDC}" if departure.delay > 0 else ""
+        lines.append(f"{clock:<5}  {minutes:>2} min  {departure.line:<8}  "
+                     f"{departure.destination[:28]:<28}  {departure.platform}{delay}")
+    if not result["departures"]:
+        lines.append("No departures found")
+    return lines
+
+class BoardDisplay:
+    """Draw lines on a terminal, rewriting only those that changed since the last draw
+    
+    On anything but a terminal every draw is printed in full instead.
+    """
+    def __init__(self, out=None):
+        self.out = out or sys.stdout
+        self.interactive = self.out.isatty()
+        self.lines = []
+    
+    def draw(self, lines):
+        out = self.out
+        if not self.interactive:
+            out.write("\n".join(lines) + "\n\n")
+            out.flush()
+            self.lines = lines
+            return
+        
+        # Lines that were drawn before but are no longer needed are blanked
+        lines = lines + [""] * (len(self.lines) - len(lines))
+        if self.lines:
+            # Back to the start of the first line drawn
+            out.write(f"\033[{len(self.lines)}A\r")
+        redrawn = 0
+        for i, line in enumerate(lines):
+            if i >= len(self.lines) or self.lines[i] != line:
+                out.write(f"\033[2K{line}")
+                redrawn += 1
+            out.write("\n")
+        _stats.count("board lines redrawn", redrawn)
+        out.flush()
+        self.lines = lines
+
+def board_main(argv):
+    """Show the next departures from a station, refreshed in place"""
+    parser = argparse.ArgumentParser(
+        prog=f"{os.path.basename(sys.argv[0])} board",
+        description=f"{Colors.BOLD}{Colors.HEADER}🚏 Departure board{Colors.ENDC}\n"
+                    f"{Colors.CYAN}The next departures from a station, updated in place{Colors.ENDC}",
+        formatter_class=ColoredHelpFormatter)
+    parser.add_argument("address", 
+                       help="Station, or an address to show the nearest station for")
+    parser.add_argument("--line", "-l", 
+                       action="append",
+                       help="Only this line, e.g. 90, IR90 or S3. Can be used multiple times")
+    parser.add_argument("--category", "-c", 
+                       action="append",
+                       help="Only this category, e.g. IR, S, B (bus) or T (tram). Can be used multiple times")
+    parser.add_argument("--to", "-t", 
+                       metavar="DESTINATION",
+                       action="append",
+                       help="Only departures towards a destination containing this. Can be used multiple times")
+    parser.add_argument("--rows", "-n", 
+                       type=int,
+                       default=BOARD_ROWS,
+                       help=f"Number of departures to show (default: {BOARD_ROWS})")
+    parser.add_argument("--refresh", 
+                       metavar="SECONDS",
+                       type=float,
+                       default=BOARD_REFRESH,
+                       help=f"Time between updates (default: {BOARD_REFRESH})")
+    parser.add_argument("--once", 
+                       action="store_true", 
+                       help="Show the board once and exit")
+    add_lookup_arguments(parser, client=False)
+    
+    args = parser.parse_args(argv)
+    if args.rows < 1:
+        parser.error("--rows must be at least 1")
+    if args.refresh <= 0:
+        parser.error("--refresh must be positive")
+    if args.backend != "api":
+        parser.error("board needs the API; the local timetable has no live departures")
+    
+    setup_lookups(parser, args)
+    
+    station = search_location(args.address)
+    if station and not station.id and station.x is not None:
+        # An address: use the nearest station
+        nearby = search_nearby(station.x, station.y)
+        station = nearby[0] if nearby else None
+    if not station:
+        print(f"Error: Could not find a station for '{args.address}'")
+        sys.exit(1)
+    
+    matches = None
+    if args.line or args.category or args.to:
+        matches = board_filter(args.line, args.category, args.to)
+    
+    display = BoardDisplay()
+    result = None
+    try:
+        while True:
+            latest = get_departures(station, args.rows, matches)
+            if latest["status"] == "OK":
+                result = latest
+            elif result is None or args.once:
+                print(f"❌ Error: {latest['message']}")
+                sys.exit(1)
+            
+            now = time.time()
+            status = (f"updated {datetime.now().strftime('%H:%M:%S')}" if latest["status"] == "OK"
+                      else f"{Colors.YELLOW}update failed: {latest['message'][:60]}{Colors.ENDC}")
+            lines = [f"🚏 {Colors.BOLD}{result['station']}{Colors.ENDC} ({status})"]
+            with _stats.timed("render"):
+                display.draw(lines + board_lines(result, now))
+            if args.once:
+                break
+            time.sleep(args.refresh)
+    except KeyboardInterrupt:
+        pass
+    
+    close_lookups()
+
+# Server mode: one long-running process keeps the connection pool, caches,
+# station index and timetable warm, and CLI invocations given --server send
+# their lookups to it as JSON over HTTP
+DEFAULT_SERVER_PORT = 8766
+
+def encode_location(location):
+    """Turn a Location (or a plain name) into JSON for the server protocol"""
+    return location.to_dict() if isinstance(location, Location) else location
+
+def decode_location(value):
+    """Inverse of encode_location()"""
+    return Location.from_dict(value) if isinstance(value, dict) else value
+
+class ServerClient:
+    """Thin client for a `serve` process, with one keep-alive connection per thread
+    
+    search_location(), get_connections(), get_profile() and reachable_stops()
+    behave like the module-level functions of the same names.
+    """
+    def __init__(self, url, timeout=60):
+        parsed = urllib.parse.urlsplit(url if "//" in url else f"http://{url}")
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or DEFAULT_SERVER_PORT
+        self.timeout = timeout
+        self.local = threading.local()
+    
+    def call(self, method, payload):
+        """POST a request to /<method> and return the decoded JSON reply"""
+        body = json.dumps(payload).encode()
+        # A kept-alive connection may have been closed by the server; retry once on a new one
+        import http.client
+        for attempt in range(2):
+            connection = getattr(self.local, "connection", None)
+            if connection is None:
+                connection = self.local.connection = http.client.HTTPConnection(
+                    self.host, self.port, timeout=self.timeout)
+            try:
+                connection.request("POST", f"/{method}", body, {"Content-Type": "application/json"})
+                response = connection.getresponse()
+                return json.loads(response.read())
+            except (http.client.HTTPException, ConnectionError):
+                connection.close()
+                self.local.connection = None
+                if attempt:
+                    raise
+    
+    def search_location(self, query):
+        try:
+            location = self.call("search_location", {"query": query})["location"]
+        except Exception as e:
+            print(f"Error searching for {query}: {e}", file=sys.stderr)
+            return None
+        return Location.from_dict(location) if location else None
+    
+    def get_connections(self, from_location, to_location, arrival_time=None, limit=1, fields=None,
+                        departure_time=None):
+        try:
+            return decode_result(self.call("get_connections", {
+                "from": encode_location(from_location),
+                "to": encode_location(to_location),
+                "arrival_time": arrival_time,
+                "limit": limit,
+                "fields": fields,
+                "departure_time": departure_time
+            }))
+        except Exception as e:
+            return {"status": "ERROR", "message": f"Server unavailable: {e}"}
+    
+    def get_profile(self, from_location, to_location, start, end, fields=None):
+        try:
+            return decode_result(self.call("get_profile", {
+                "from": encode_location(from_location),
+                "to": encode_location(to_location),
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "fields": fields
+            }))
+        except Exception as e:
+            return {"status": "ERROR", "message": f"Server unavailable: {e}"}
+    
+    def reachable_stops(self, origin, when, limit, radius, jobs):
+        try:
+            return self.call("reachable_stops", {
+                "origin": encode_location(origin),
+                "when": when.isoformat(),
+                "limit": limit,
+                "radius": radius,
+                "jobs": jobs
+            })
+        except Exception as e:
+            return {"status": "ERROR", "message": f"Server unavailable: {e}"}
+
+def serve_search_location(request):
+    location = search_location(request["query"])
+    return {"location": location.to_dict() if location else None}
+
+def serve_get_connections(request):
+    return encode_result(get_connections(decode_location(request["from"]), decode_location(request["to"]),
+                           request.get("arrival_time"), request.get("limit", 1),
+                           request.get("fields"), request.get("departure_time")))
+
+def serve_get_profile(request):
+    return encode_result(get_profile(decode_location(request["from"]), decode_location(request["to"]),
+                       datetime.fromisoformat(request["start"]),
+                       datetime.fromisoformat(request["end"]), request.get("fields")))
+
+def serve_reachable_stops(request):
+    return reachable_stops(decode_location(request["origin"]), datetime.fromisoformat(request["when"]),
+                           request["limit"], request["radius"], request.get("jobs", DEFAULT_JOBS))
+
+# Methods a `serve` process answers, by request path
+SERVER_METHODS = {
+    "/search_location": serve_search_location,
+    "/get_connections": serve_get_connections,
+    "/get_profile": serve_get_profile,
+    "/reachable_stops": serve_reachable_stops,
+}
+
+def lookup_request_handler():
+    """Return the request handler class for `serve`, importing http.server only when serving"""
+    import http.server
+    
+    class LookupRequestHandler(http.server.BaseHTTPRequestHandler):
+        """Answer POSTed JSON lookups with the module-level lookup functions"""
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; don't let the second wait for an ACK
+        disable_nagle_algorithm = True
+        
+        def do_POST(self):
+            method = SERVER_METHODS.get(self.path)
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if method is None:
+                    status, reply = 404, {"status": "ERROR", "message": f"Unknown method {self.path}"}
+                else:
+                    status, reply = 200, method(request)
+            except (ValueError, KeyError, TypeError) as e:
+                status, reply = 400, {"status": "ERROR", "message": f"Bad request: {e}"}
+            
+            body = json.dumps(reply).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def do_GET(self):
+            if self.path == "/health":
+                body = b'{"status": "OK"}'
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self.send_error(404)
+        
+        def log_message(self, format, *args):
+            pass
+    
+    return LookupRequestHandler
+
+def serve_main(argv):
+    """Run a long-lived lookup server that CLI invocations reach with --server"""
+    parser = argparse.ArgumentParser(
+        prog=f"{os.path.basename(sys.argv[0])} serve",
+        description=f"{Colors.BOLD}{Colors.HEADER}🚉 Lookup server{Colors.ENDC}\n"
+                    f"{Colors.CYAN}Keep connections, caches and the timetable warm for fast repeat queries{Colors.ENDC}",
+        formatter_class=ColoredHelpFormatter)
+    parser.add_argument("--host", 
+                       default="127.0.0.1",
+                       help="Address to listen on (default: %(default)s)")
+    parser.add_argument("--port", 
+                       type=int,
+                       default=DEFAULT_SERVER_PORT,
+                       help=f"Port to listen on (default: {DEFAULT_SERVER_PORT})")
+    add_lookup_arguments(parser, client=False)
+    
+    args = parser.parse_args(argv)
+    setup_lookups(parser, args)
+    # Built now rather than for the first query
+    get_station_index()
+    
+    from http.server import ThreadingHTTPServer
+    server = ThreadingHTTPServer((args.host, args.port), lookup_request_handler())
+    server.daemon_threads = True
+    print(f"🛰️  Serving lookups on http://{args.host}:{server.server_port} "
+          f"(backend: {args.backend}). Use --server http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        close_lookups()
+
+# Subcommands, selected by the first command-line argument
+COMMANDS = {
+    "matrix": matrix_main,
+    "import-gtfs": import_gtfs_main,
+    "isochrone": isochrone_main,
+    "serve": serve_main,
+    "board": board_main,
+}
 
 if __name__ == "__main__":
     main()
\ No newline at end of file